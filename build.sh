@@ -9,6 +9,13 @@ python manage.py collectstatic --noinput --clear
 RUN_MIGRATIONS=true
 python manage.py migrate
 
+# Database cache tables (catalog version stamps, throttle buckets)
+python manage.py createcachetable
+
+# Periodic commands (leaderboards, exp buffer, skill modifiers, compaction) are not
+# run here: schedule ./cron.sh (see the header there). After raising
+# FIELD_ROWS/FIELD_COLS run python manage.py grow_fields once.
+
 if [ "$CREATE_SUPERUSER" = "true" ]; then
   python manage.py shell << EOF
 from django.contrib.auth import get_user_model
@@ -0,0 +1,26 @@
+#!/usr/bin/env bash
+# Periodic maintenance commands. Schedule them with cron or a hosted cron job:
+#
+#   * * * * *  cd /path/to/app && ./cron.sh minutely
+#   30 3 * * * cd /path/to/app && ./cron.sh daily
+set -e
+
+case "$1" in
+  minutely)
+    # Skill modifiers after skills are edited in the admin
+    python manage.py refresh_skill_modifiers
+    # Buffered experience of players who stopped harvesting (see game/experience.py)
+    python manage.py flush_exp
+    # Leaderboard ranks: the endpoints only read them (see game/leaderboard.py)
+    python manage.py refresh_leaderboards
+    ;;
+  daily)
+    # Empty inventory rows and old coin ledger entries
+    python manage.py compact_inventory
+    python manage.py compact_coin_ledger
+    ;;
+  *)
+    echo "Usage: $0 minutely|daily" >&2
+    exit 1
+    ;;
+esac
@@ -49,7 +49,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'game.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -93,6 +93,72 @@ DATABASES = {
 }
 
 
+# Cache
+# "shared" виден всем gunicorn-воркерам: метки версий каталога и т.п.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'farmotoria_cache',
+    },
+    # Вёдра лимитов при THROTTLE_BACKEND = 'cache': по записи на (игрок, scope).
+    # Отдельная таблица — вытеснение и clear() вёдер не трогают метку версии
+    # каталога в 'shared'. DatabaseCache считает записи (COUNT(*)) на каждый set,
+    # поэтому для нескольких узлов под нагрузкой лучше общий Redis/Memcached
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'farmotoria_throttle_cache',
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
+}
+
+CATALOG_CACHE = 'shared'
+CATALOG_VERSION_CHECK_SECONDS = 1
+CATALOG_HTTP_MAX_AGE = 60
+
+# Строки инвентаря с quantity=0 старше этого срока удаляет compact_inventory
+INVENTORY_EMPTY_RETENTION_DAYS = 30
+
+# Записи журнала монет старше этого срока compact_coin_ledger сворачивает в снимки
+COIN_LEDGER_RETENTION_DAYS = 90
+
+# Буфер опыта: применяем, когда у игрока накопилось столько начислений
+# или самое старое старше этого срока (и периодически: flush_exp в cron.sh)
+EXP_FLUSH_MAX_PENDING = 20
+EXP_FLUSH_MAX_AGE_SECONDS = 60
+
+# Что получает новый игрок (см. game/provisioning.py).
+# FIELD_ROWS x FIELD_COLS — только заранее созданные клетки, а не граница поля:
+# размер поля клиента не зафиксирован, поэтому клетка за этими пределами
+# создаётся при первом действии, но не дальше FIELD_MAX_ROWS x FIELD_MAX_COLS
+FIELD_ROWS = 6
+FIELD_COLS = 6
+FIELD_MAX_ROWS = 100
+FIELD_MAX_COLS = 100
+STARTING_COINS = 0
+STARTING_INVENTORY = {}  # {slug ShopItem: количество}
+
+# Принципал JWT (пользователь + id профиля) в памяти воркера, см. game/authentication.py
+AUTH_PRINCIPAL_CACHE_SECONDS = 30
+AUTH_PRINCIPAL_CACHE_SIZE = 10000
+
+# Token bucket для действий игрока (см. game/throttling.py):
+# {scope: (токенов в секунду, ёмкость ведра)}
+THROTTLE_RATES = {
+    'cell_action': (5, 20),
+    'cell_batch': (1, 5),
+    'buy': (2, 10),
+    'sell': (2, 10),
+}
+# "local" — в памяти воркера, "cache" — общий кэш THROTTLE_CACHE для нескольких узлов
+THROTTLE_BACKEND = 'local'
+THROTTLE_CACHE = 'throttle'  # не CATALOG_CACHE: см. CACHES
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -6,9 +6,13 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from game.views import (
     FarmotoriaPingView, RegisterView, MeView,
-    CellListView, CellActionView, InventoryView,
+    CellListView, CellActionView, CellBatchActionView, CellHarvestAllView, NextReadyView,
+    FieldGridView,
+    InventoryView,
     ShopSeedsListView, ShopHarvestListView, PlantListView,
-    SellItemView, market_inventory, ShopByCategoryView, buy_item,
+    SellItemView, SellBulkView, market_inventory, ShopByCategoryView, buy_item,
+    CheckoutView, CoinHistoryView,
+    LeaderboardTopView, LeaderboardMeView,
 )
 
 urlpatterns = [
@@ -24,10 +28,15 @@ urlpatterns = [
 
     # profile
     path("api/me/", MeView.as_view()),
+    path("api/me/coins/history/", CoinHistoryView.as_view()),
 
     # field
     path("api/field/cells/", CellListView.as_view()),
     path("api/field/cells/action/", CellActionView.as_view()),
+    path("api/field/cells/action/batch/", CellBatchActionView.as_view()),
+    path("api/field/cells/harvest-all/", CellHarvestAllView.as_view()),
+    path("api/field/next-ready/", NextReadyView.as_view()),
+    path("api/field/grid/", FieldGridView.as_view()),
     path("api/plants/", PlantListView.as_view()),
 
     # inventory
@@ -37,6 +46,7 @@ urlpatterns = [
     path("api/shop/seeds/", ShopSeedsListView.as_view()),
     path("api/shop/harvest/", ShopHarvestListView.as_view()),
     path("api/shop/buy/", buy_item),  # ✅ ВЕРХУ перед <str:category>!!!
+    path("api/shop/checkout/", CheckoutView.as_view()),
 
     # ✅ ПАРАМЕТРИЧЕСКИЙ - В КОНЦЕ (ловит Seeds, Products, Resources)
     path('api/shop/<str:category>/', ShopByCategoryView.as_view(), name='shop-category'),
@@ -44,6 +54,11 @@ urlpatterns = [
     # market
     path("api/market/inventory/", market_inventory, name="market-inventory"),
     path("api/market/sell/", SellItemView.as_view()),
+    path("api/market/sell/bulk/", SellBulkView.as_view()),
+
+    # leaderboards
+    path("api/leaderboard/<str:board>/", LeaderboardTopView.as_view()),
+    path("api/leaderboard/<str:board>/me/", LeaderboardMeView.as_view()),
 ]
 
 if not settings.DEBUG:
@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.db import transaction
+
 from .models import (
     PlayerProfile,
+    CoinLedgerEntry,
+    CoinBalanceSnapshot,
+    LeaderboardEntry,
     ItemCategory,
     ShopItem,
     Cell,
@@ -14,9 +19,48 @@ from .models import (
 # =========================
 @admin.register(PlayerProfile)
 class PlayerProfileAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "coins_balance", "level", "exp")
+    list_display = ("id", "user", "coins_balance", "level", "exp", "harvest_count")
     search_fields = ("user__username",)
     list_editable = ("coins_balance",)
+    # Считаются автоматически (см. skills.py)
+    readonly_fields = ("skills_version", "skill_modifiers")
+
+    def save_model(self, request, obj, form, change):
+        # Ручное изменение баланса тоже попадает в журнал монет
+        delta = obj.coins_balance - (form.initial.get("coins_balance") or 0)
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if delta:
+                CoinLedgerEntry.objects.create(
+                    player=obj, amount=delta, reason=CoinLedgerEntry.Reason.ADMIN
+                )
+
+# =========================
+# Журнал монет
+# =========================
+@admin.register(CoinLedgerEntry)
+class CoinLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("id", "player", "amount", "reason", "created_at")
+    list_filter = ("reason",)
+    search_fields = ("player__user__username",)
+    raw_id_fields = ("player",)
+    list_per_page = 50
+
+    # Журнал дописывается только вместе с изменением баланса
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(CoinBalanceSnapshot)
+class CoinBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "player", "balance", "taken_at")
+    search_fields = ("player__user__username",)
+    raw_id_fields = ("player",)
 
 # =========================
 # Категории товаров
@@ -51,7 +95,7 @@ class ShopItemAdmin(admin.ModelAdmin):
 # =========================
 @admin.register(Cell)
 class CellAdmin(admin.ModelAdmin):
-    list_display = ("id", "owner", "row", "col", "shop_item", "planted_at", "is_growing")
+    list_display = ("id", "owner", "row", "col", "shop_item", "planted_at", "ready_at", "is_growing")
     list_filter = ("owner", "shop_item")
     search_fields = ("owner__username", "shop_item__name")
     readonly_fields = ("is_growing",)
@@ -93,4 +137,21 @@ class SkillAdmin(admin.ModelAdmin):
 class UserSkillAdmin(admin.ModelAdmin):
     list_display = ("user", "skill", "level", "exp")
     list_filter = ("skill", "level")
-    search_fields = ("user__username", "skill__name")
\ No newline at end of file
+    search_fields = ("user__username", "skill__name")
+
+# =========================
+# Рейтинги
+# =========================
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    # Пересчитывается командой refresh_leaderboards
+    list_display = ("board", "period", "rank", "player", "score")
+    list_filter = ("board", "period")
+    search_fields = ("player__user__username",)
+    raw_id_fields = ("player",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,92 @@
+"""
+JWT-аутентификация с кэшем принципала в памяти воркера.
+
+JWTAuthentication на каждый запрос читает auth.User по user_id из токена,
+а view затем отдельно ищут id профиля. Здесь пользователь вместе с id его
+профиля (user.profile_id) хранится в памяти воркера
+AUTH_PRINCIPAL_CACHE_SECONDS секунд, и обычный запрос не делает ни одного
+запроса до игровой логики.
+
+Изменяемые поля профиля (монеты, опыт) в принципале не хранятся — только
+неизменный id. Запись сбрасывают сигналы (signals.py) при сохранении User
+и при создании/удалении PlayerProfile; в других воркерах она живёт не
+дольше TTL — на столько может задержаться, например, блокировка
+пользователя (is_active=False).
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import PlayerProfile
+
+_lock = threading.Lock()
+_principals = {}  # {user_id: (expires_at, user)}
+
+
+def invalidate_principal(user_id) -> None:
+    with _lock:
+        _principals.pop(user_id, None)
+
+
+def clear_principals() -> None:
+    with _lock:
+        _principals.clear()
+
+
+def _cached(user_id):
+    with _lock:
+        entry = _principals.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _principals[user_id]
+            return None
+        return entry[1]
+
+
+def _remember(user_id, user) -> None:
+    now = time.monotonic()
+    with _lock:
+        if len(_principals) >= settings.AUTH_PRINCIPAL_CACHE_SIZE:
+            # Сначала выбрасываем просроченные; не помогло — начинаем с нуля
+            for key in [key for key, (expires_at, _) in _principals.items() if expires_at <= now]:
+                del _principals[key]
+            if len(_principals) >= settings.AUTH_PRINCIPAL_CACHE_SIZE:
+                _principals.clear()
+        _principals[user_id] = (now + settings.AUTH_PRINCIPAL_CACHE_SECONDS, user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = _cached(user_id)
+
+        if user is None:
+            # Проверки is_active и т.п. — в JWTAuthentication, кэшируем только прошедших
+            user = super().get_user(validated_token)
+            user.profile_id = (
+                PlayerProfile.objects.filter(user=user).values_list("id", flat=True).first()
+            )
+            _remember(user_id, user)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            # Токен выдан до смены пароля
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+
+        return user
+
+
+def get_profile_id(user) -> int:
+    """
+    id профиля игрока: из принципала CachedJWTAuthentication, иначе запросом
+    """
+    profile_id = getattr(user, "profile_id", None)
+    if profile_id is None:
+        profile_id = PlayerProfile.objects.values_list("id", flat=True).get(user=user)
+    return profile_id
@@ -0,0 +1,150 @@
+"""
+Каталог магазина (ShopItem + ItemCategory) и навыков (Skill) в памяти процесса.
+
+Каталог меняется только из админки, поэтому каждый воркер загружает его
+один раз и перечитывает, когда меняется общая метка версии в кэше "shared".
+Метку обновляют сигналы post_save/post_delete (см. signals.py).
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import ItemCategory, ShopItem, Skill
+
+VERSION_KEY = "game:catalog:version"
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0
+
+
+class Catalog:
+    def __init__(self, version: str, categories, items, skills=()):
+        self.version = version
+        self.categories = {category.id: category for category in categories}
+        self.items = {}
+
+        for item in items:
+            item.category = self.categories[item.category_id]
+            self.items[item.id] = item
+
+        # Связи семя → урожай указывают на объекты из того же каталога
+        for item in self.items.values():
+            if item.harvest_item_id in self.items:
+                item.harvest_item = self.items[item.harvest_item_id]
+
+        ordered = sorted(self.items.values(), key=lambda i: (i.price_coins, i.id))
+
+        self.by_slug = {item.slug: item for item in ordered}
+        self.by_category = {category.name: [] for category in categories}
+        for item in ordered:
+            self.by_category[item.category.name].append(item)
+
+        self.seeds = [item for item in ordered if item.is_seed]
+        self.harvests = [item for item in ordered if item.is_harvest]
+        self.harvest_for_seed = {
+            seed.id: self.items[seed.harvest_item_id]
+            for seed in self.seeds if seed.harvest_item_id in self.items
+        }
+
+        self.skills = sorted(skills, key=lambda s: s.id)
+        self.skills_by_id = {skill.id: skill for skill in self.skills}
+        self.skills_by_code = {skill.code: skill for skill in self.skills}
+        # Версия набора навыков и их эффектов (см. skills.py)
+        self.skills_version = hashlib.md5(
+            ";".join(
+                f"{skill.id},{skill.code},{skill.effect_value_per_level}" for skill in self.skills
+            ).encode()
+        ).hexdigest()
+
+        # Готовые JSON-тела ответов каталога (см. views.CatalogListView)
+        self.rendered = {}
+
+    def get(self, item_id):
+        try:
+            return self.items.get(int(item_id))
+        except (TypeError, ValueError):
+            return None
+
+    def seed(self, item_id):
+        item = self.get(item_id)
+        return item if item is not None and item.is_seed else None
+
+
+def _shared_cache():
+    return caches[settings.CATALOG_CACHE]
+
+
+def catalog_version() -> str:
+    """
+    Общая для всех воркеров метка версии каталога
+    """
+    cache = _shared_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _load(version: str) -> Catalog:
+    return Catalog(
+        version,
+        list(ItemCategory.objects.all()),
+        list(ShopItem.objects.all()),
+        list(Skill.objects.all()),
+    )
+
+
+def get_catalog() -> Catalog:
+    """
+    Каталог текущего воркера. Метку версии проверяем не чаще,
+    чем раз в CATALOG_VERSION_CHECK_SECONDS.
+    """
+    global _catalog, _checked_at
+
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now - _checked_at < settings.CATALOG_VERSION_CHECK_SECONDS:
+        return catalog
+
+    with _lock:
+        version = catalog_version()
+        if _catalog is None or _catalog.version != version:
+            _catalog = _load(version)
+        _checked_at = now
+        return _catalog
+
+
+def attach_items(cells) -> None:
+    """
+    Подставляет в cell.shop_item объект из каталога, чтобы не было запроса к БД
+    """
+    items = get_catalog().items
+    field = cells[0]._meta.get_field("shop_item") if cells else None
+    for cell in cells:
+        item = items.get(cell.shop_item_id)
+        if item is not None:
+            field.set_cached_value(cell, item)
+
+
+def _bump_version() -> None:
+    _shared_cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_catalog() -> None:
+    """
+    Сбрасывает каталог этого воркера и меняет общую метку версии.
+    Метку меняем ещё раз после коммита: воркеры, успевшие перечитать
+    каталог до коммита, получат свежие данные.
+    """
+    global _catalog
+    with _lock:
+        _catalog = None
+        _bump_version()
+    transaction.on_commit(_bump_version)
@@ -0,0 +1,170 @@
+"""
+Монеты и инвентарь: изменения одним условным UPDATE с F-выражениями.
+
+Значения не читаются в Python перед записью, поэтому параллельные запросы
+одного игрока не теряют обновления и не требуют блокировок строк.
+Строки инвентаря с quantity=0 не удаляются: их чистит compact_inventory.
+Каждое изменение баланса записывается в CoinLedgerEntry в той же транзакции.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .models import CoinBalanceSnapshot, CoinLedgerEntry, InventoryItem, PlayerProfile
+
+Reason = CoinLedgerEntry.Reason
+
+
+def parse_quantity(value, default: int = 1) -> int:
+    """
+    Положительное целое количество из запроса, иначе ValueError
+    """
+    if value is None:
+        return default
+    quantity = int(value)
+    if quantity <= 0:
+        raise ValueError("Количество должно быть положительным")
+    return quantity
+
+
+# =========================
+# Монеты
+# =========================
+
+def debit_coins(profile_id: int, amount: int, reason: str) -> bool:
+    """
+    Списывает монеты, если хватает баланса: UPDATE ... WHERE coins_balance >= amount
+    """
+    if amount <= 0:
+        return True
+    with transaction.atomic(savepoint=False):
+        debited = (
+            PlayerProfile.objects
+            .filter(id=profile_id, coins_balance__gte=amount)
+            .update(coins_balance=F("coins_balance") - amount)
+        )
+        if debited:
+            CoinLedgerEntry.objects.create(player_id=profile_id, amount=-amount, reason=reason)
+    return bool(debited)
+
+
+def credit_coins(profile_id: int, amount: int, reason: str) -> None:
+    if amount <= 0:
+        return
+    with transaction.atomic(savepoint=False):
+        PlayerProfile.objects.filter(id=profile_id).update(coins_balance=F("coins_balance") + amount)
+        CoinLedgerEntry.objects.create(player_id=profile_id, amount=amount, reason=reason)
+
+
+def coins_balance(profile_id: int) -> int:
+    return PlayerProfile.objects.values_list("coins_balance", flat=True).get(id=profile_id)
+
+
+def ledger_balance(profile_id: int) -> int:
+    """
+    Баланс по журналу: последний снимок + записи после него.
+    Для сверки с PlayerProfile.coins_balance.
+    """
+    snapshot = (
+        CoinBalanceSnapshot.objects
+        .filter(player_id=profile_id)
+        .order_by("-taken_at")
+        .values_list("balance", "taken_at")
+        .first()
+    )
+    entries = CoinLedgerEntry.objects.filter(player_id=profile_id)
+    opening = 0
+    if snapshot is not None:
+        opening, taken_at = snapshot
+        entries = entries.filter(created_at__gte=taken_at)
+    return opening + (entries.aggregate(total=Sum("amount"))["total"] or 0)
+
+
+# =========================
+# Инвентарь
+# =========================
+
+def upsert_inventory(player_id: int, quantities: dict) -> None:
+    """
+    Добавляет {item_id: quantity} одним запросом:
+    INSERT ... ON CONFLICT (player_id, item_id) DO UPDATE quantity = quantity + n.
+    Синтаксис одинаков для PostgreSQL и SQLite (3.24+).
+    """
+    quantities = {item_id: qty for item_id, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    table = connection.ops.quote_name(InventoryItem._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(quantities))
+    now = InventoryItem._meta.get_field("updated_at").get_db_prep_value(timezone.now(), connection)
+    params = []
+    for item_id, qty in quantities.items():
+        params += [player_id, item_id, qty, now]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (player_id, item_id, quantity, updated_at) VALUES {values} "
+            f"ON CONFLICT (player_id, item_id) "
+            f"DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity, "
+            f"updated_at = EXCLUDED.updated_at",
+            params,
+        )
+
+
+def add_inventory(player_id: int, item_id: int, quantity: int) -> None:
+    upsert_inventory(player_id, {item_id: quantity})
+
+
+def take_inventory(player_id: int, item_id: int, quantity: int) -> bool:
+    """
+    Списывает quantity, если столько есть: UPDATE ... WHERE quantity >= n
+    """
+    return bool(
+        InventoryItem.objects
+        .filter(player_id=player_id, item_id=item_id, quantity__gte=quantity)
+        .update(quantity=F("quantity") - quantity, updated_at=timezone.now())
+    )
+
+
+def _take_many(player_id: int, key: str, quantities: dict) -> bool:
+    """
+    Одним UPDATE ... CASE списывает {key: quantity} по полю key ("id" или "item_id").
+    True — если хватило на все строки.
+    """
+    if not quantities:
+        return True
+    enough = Q()
+    for value, qty in quantities.items():
+        enough |= Q(**{key: value, "quantity__gte": qty})
+    updated = (
+        InventoryItem.objects
+        .filter(enough, player_id=player_id)
+        .update(quantity=Case(
+            *[When(**{key: value, "then": F("quantity") - qty}) for value, qty in quantities.items()],
+            default=F("quantity"),
+            output_field=PositiveIntegerField(),
+        ), updated_at=timezone.now())
+    )
+    return updated == len(quantities)
+
+
+def take_inventory_rows(player_id: int, quantities: dict) -> bool:
+    """
+    Списывает {InventoryItem.id: quantity} одним условным UPDATE
+    """
+    return _take_many(player_id, "id", quantities)
+
+
+def apply_inventory_deltas(player_id: int, deltas: dict) -> bool:
+    """
+    Применяет изменения {item_id: delta}: списания — одним условным
+    UPDATE ... CASE, пополнения — одним upsert.
+    False — если какой-то строки не хватает на списание (ничего не записано
+    только при откате внешней транзакции).
+    """
+    spent = {item_id: -delta for item_id, delta in deltas.items() if delta < 0}
+    if not _take_many(player_id, "item_id", spent):
+        return False
+
+    upsert_inventory(player_id, {item_id: delta for item_id, delta in deltas.items() if delta > 0})
+    return True
@@ -0,0 +1,155 @@
+"""
+Буфер опыта (write-behind).
+
+Вместо двух полных UPDATE (профиль + навык) на каждое очко опыта запрос
+делает один upsert в ExpDelta: одна строка на (игрок, цель), начисления
+складываются. Счётчик урожая (PlayerProfile.harvest_count) копится там же,
+в строке профиля. Тот же запрос возвращает накопленное (RETURNING), так что
+счётчик и возраст буфера известны без отдельного чтения.
+
+Накопленный опыт применяется пачкой (flush_exp): после коммита, когда в строке
+набралось EXP_FLUSH_MAX_PENDING начислений или она старше
+EXP_FLUSH_MAX_AGE_SECONDS; перед пакетными действиями; командой flush_exp
+(cron.sh) — для тех, кто перестал собирать урожай.
+Уровни при этом считаются через progression.py.
+
+Чтения (профиль в ответах, /api/me/) добавляют буфер к сохранённым значениям
+в памяти — apply_exp(..., save=False).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import ExpDelta, PlayerProfile
+from .progression import add_profile_exp
+from .skills import load_user_skills, refresh_modifiers, save_user_skills
+
+# Цель опыта профиля в {target: amount} (ExpDelta.target), иначе Skill.id
+PROFILE = 0
+
+
+def buffer_exp(user, amounts: dict, harvests: int = 0) -> tuple:
+    """
+    Откладывает опыт {target: amount} и harvests собранного урожая одним upsert.
+    Возвращает (накоплено {target: amount}, пора ли применять буфер).
+    """
+    amounts = {target: amount for target, amount in amounts.items() if amount > 0}
+    if harvests > 0:
+        amounts.setdefault(PROFILE, 0)
+    if not amounts:
+        return {}, False
+
+    table = connection.ops.quote_name(ExpDelta._meta.db_table)
+    created_at = ExpDelta._meta.get_field("created_at")
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.EXP_FLUSH_MAX_AGE_SECONDS)
+    values = ", ".join(["(%s, %s, %s, %s, 1, %s)"] * len(amounts))
+    params = []
+    for target, amount in amounts.items():
+        params += [
+            user.pk, target, amount, harvests if target == PROFILE else 0,
+            created_at.get_db_prep_value(now, connection),
+        ]
+    params.append(created_at.get_db_prep_value(cutoff, connection))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, target, amount, harvests, grants, created_at) VALUES {values} "
+            f"ON CONFLICT (user_id, target) "
+            f"DO UPDATE SET amount = {table}.amount + EXCLUDED.amount, "
+            f"harvests = {table}.harvests + EXCLUDED.harvests, grants = {table}.grants + 1 "
+            f"RETURNING target, amount, grants, created_at <= %s",
+            params,
+        )
+        rows = cursor.fetchall()
+
+    totals = {target: amount for target, amount, _, _ in rows}
+    due = any(grants >= settings.EXP_FLUSH_MAX_PENDING or stale for _, _, grants, stale in rows)
+    return totals, due
+
+
+def pending_exp(user) -> dict:
+    """
+    Неприменённый опыт игрока {target: amount}
+    """
+    return dict(ExpDelta.objects.filter(user=user).values_list("target", "amount"))
+
+
+def apply_exp(user, profile: PlayerProfile, amounts: dict, user_skills=None, save: bool = True, harvests: int = 0):
+    """
+    Начисляет опыт профилю и навыкам через таблицы progression.py,
+    harvests — к счётчику урожая.
+    save=False — только в памяти (чтение с учётом буфера).
+    Возвращает навыки игрока (загружаются, если нужен опыт навыкам).
+    """
+    update_fields = ["exp", "level"]
+    add_profile_exp(profile, amounts.get(PROFILE, 0))
+    if harvests:
+        profile.harvest_count += harvests
+        update_fields.append("harvest_count")
+
+    if user_skills is None and any(target != PROFILE for target in amounts):
+        user_skills = load_user_skills(user, profile)
+
+    touched = []
+    level_changed = False
+    for user_skill in user_skills or []:
+        amount = amounts.get(user_skill.skill_id, 0)
+        if amount > 0:
+            level_changed |= user_skill.add_exp(amount, save=False)
+            touched.append(user_skill)
+    if level_changed:
+        refresh_modifiers(profile, user_skills)
+        update_fields.append("skill_modifiers")
+
+    if save:
+        save_user_skills(touched)
+        profile.save(update_fields=update_fields)
+    return user_skills
+
+
+def flush_exp(user):
+    """
+    Применяет буфер игрока. Возвращает обновлённый профиль или None,
+    если применять было нечего.
+    """
+    if not ExpDelta.objects.filter(user=user).exists():
+        return None
+
+    table = connection.ops.quote_name(ExpDelta._meta.db_table)
+    with transaction.atomic():
+        profile = PlayerProfile.objects.select_for_update().get(user=user)
+        # Под блокировкой профиля: параллельный flush уже мог всё применить.
+        # Строки забираем тем же запросом, что и удаляем, — начисления после
+        # него попадут в новые строки и дождутся следующего flush.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE user_id = %s RETURNING target, amount, harvests", [user.pk]
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            return None
+        amounts = {target: amount for target, amount, _ in rows}
+        apply_exp(user, profile, amounts, harvests=sum(harvests for _, _, harvests in rows))
+    return profile
+
+
+def harvest_exp(user, profile: PlayerProfile, amount: int, skill_code: str) -> PlayerProfile:
+    """
+    Откладывает опыт профилю и навыку skill_code и +1 к счётчику урожая,
+    дополняет profile в памяти отложенным опытом. Если буфер пора применить —
+    применяет после коммита.
+    """
+    skill = get_catalog().skills_by_code.get(skill_code)
+    gained = {PROFILE: amount}
+    if skill is not None:
+        gained[skill.id] = amount
+
+    totals, due = buffer_exp(user, gained, harvests=1)
+    if due:
+        transaction.on_commit(lambda: flush_exp(user), robust=True)
+    apply_exp(user, profile, {PROFILE: totals.get(PROFILE, 0)}, user_skills=[], save=False)
+    return profile
@@ -0,0 +1,207 @@
+"""
+Рейтинги игроков: уровень (весь опыт), монеты, собранный урожай.
+
+Места не считаются на запросе. Команда refresh_leaderboards (cron.sh, раз
+в минуту) одним проходом по профилям считает очки — вместе с ещё не
+применённым буфером опыта и урожая (experience.py) — и переписывает только
+изменившиеся строки LeaderboardEntry. Эндпоинты читают готовые места по
+индексам (board, period, rank) и (board, period, player): top-N и «я ± соседи»
+не зависят от числа игроков.
+
+Недельный рейтинг — прирост очков с начала недели: при первом пересчёте,
+в котором игрок попал в неделю, его текущие очки запоминаются в base.
+
+Пересчёты не накладываются: на PostgreSQL их разводит advisory lock
+(refresh_lock), а новые строки пишутся upsert'ом — даже наложившийся
+пересчёт не упадёт на unique (board, period, player).
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .experience import PROFILE
+from .models import ExpDelta, LeaderboardEntry, PlayerProfile
+from .progression import PROFILE_LEVEL_CAP, profile_table
+
+Board = LeaderboardEntry.Board
+
+PERIOD_ALL = "all"
+PERIOD_WEEK = "week"
+
+# Ключ pg_advisory_lock пересчёта рейтингов
+REFRESH_LOCK_ID = 0x4C42
+
+
+def week_period(now: datetime | None = None) -> str:
+    year, week, _ = (now or timezone.now()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def resolve_period(period: str) -> str | None:
+    """
+    ?period= ("all" / "week") → LeaderboardEntry.period, None — неизвестный период
+    """
+    if period == PERIOD_ALL:
+        return PERIOD_ALL
+    if period == PERIOD_WEEK:
+        return week_period()
+    return None
+
+
+# =========================
+# Пересчёт
+# =========================
+
+def profile_scores() -> dict:
+    """
+    {board: {player_id: очки за всё время}} одним проходом по профилям
+    и одним — по буферу опыта
+    """
+    table = profile_table()
+    scores = {board: {} for board in Board.values}
+    rows = PlayerProfile.objects.values_list("id", "level", "exp", "coins_balance", "harvest_count")
+    for player_id, level, exp, coins, harvests in rows.iterator(chunk_size=2000):
+        scores[Board.LEVEL][player_id] = table[min(max(level, 1), PROFILE_LEVEL_CAP) - 1] + exp
+        scores[Board.COINS][player_id] = coins
+        scores[Board.HARVEST][player_id] = harvests
+
+    # Буфер читаем после профилей: применённый между запросами опыт не
+    # посчитается дважды, а недосчитанный догонит следующий пересчёт
+    pending = ExpDelta.objects.filter(target=PROFILE).values_list("user__profile__id", "amount", "harvests")
+    for player_id, amount, harvests in pending.iterator(chunk_size=2000):
+        if player_id in scores[Board.LEVEL]:
+            # Очки уровня — весь накопленный опыт: буфер просто добавляется
+            scores[Board.LEVEL][player_id] += amount
+            scores[Board.HARVEST][player_id] += harvests
+    return scores
+
+
+def refresh_board(board: str, period: str, totals: dict, weekly: bool = False, batch_size: int = 1000) -> int:
+    """
+    Переписывает места одного рейтинга. Возвращает число записанных строк.
+    Равные очки упорядочены по player_id: место у каждого игрока своё.
+    """
+    existing = _existing_entries(board, period)
+
+    bases = {}
+    scores = {}
+    for player_id, total in totals.items():
+        entry = existing.get(player_id)
+        if entry is not None:
+            bases[player_id] = entry[2]
+        else:
+            bases[player_id] = total if weekly else 0
+        scores[player_id] = total - bases[player_id]
+
+    created = []
+    changed = []
+    for rank, player_id in enumerate(sorted(scores, key=lambda pid: (-scores[pid], pid)), start=1):
+        entry = existing.get(player_id)
+        if entry is None:
+            created.append(LeaderboardEntry(
+                board=board, period=period, player_id=player_id,
+                score=scores[player_id], base=bases[player_id], rank=rank,
+            ))
+        elif entry[1] != scores[player_id] or entry[3] != rank:
+            changed.append(LeaderboardEntry(id=entry[0], score=scores[player_id], rank=rank))
+
+    with transaction.atomic():
+        # Строку мог успеть создать наложившийся пересчёт: тогда обновляем её
+        LeaderboardEntry.objects.bulk_create(
+            created, batch_size=batch_size, update_conflicts=True,
+            unique_fields=["board", "period", "player"], update_fields=["score", "rank"],
+        )
+        LeaderboardEntry.objects.bulk_update(changed, ["score", "rank"], batch_size=batch_size)
+    return len(created) + len(changed)
+
+
+def _existing_entries(board: str, period: str) -> dict:
+    """
+    {player_id: (id, score, base, rank)} — кортежи, а не модели: строк столько же, сколько игроков
+    """
+    rows = (
+        LeaderboardEntry.objects
+        .filter(board=board, period=period)
+        .values_list("player_id", "id", "score", "base", "rank")
+    )
+    return {player_id: entry for player_id, *entry in rows.iterator(chunk_size=2000)}
+
+
+@contextmanager
+def refresh_lock():
+    """
+    True — пересчёт можно начинать, False — он уже идёт в другом процессе.
+    Блокировка сессии PostgreSQL снимается и при обрыве соединения.
+    В SQLite записи и так идут по очереди, наложение переживает upsert.
+    """
+    if connection.vendor != "postgresql":
+        yield True
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [REFRESH_LOCK_ID])
+        locked = cursor.fetchone()[0]
+    try:
+        yield locked
+    finally:
+        if locked:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [REFRESH_LOCK_ID])
+
+
+def refresh_leaderboards(now: datetime | None = None) -> int | None:
+    """
+    Пересчитывает все рейтинги за всё время и за текущую неделю.
+    None — пересчёт уже идёт в другом процессе.
+    """
+    with refresh_lock() as locked:
+        if not locked:
+            return None
+
+        now = now or timezone.now()
+        week = week_period(now)
+        written = 0
+        for board, totals in profile_scores().items():
+            written += refresh_board(board, PERIOD_ALL, totals)
+            written += refresh_board(board, week, totals, weekly=True)
+
+        # Храним текущую и прошлую неделю
+        previous_week = week_period(now - timedelta(weeks=1))
+        LeaderboardEntry.objects.exclude(period__in=[PERIOD_ALL, week, previous_week]).delete()
+    return written
+
+
+# =========================
+# Чтение
+# =========================
+
+def _entries(board: str, period: str):
+    return (
+        LeaderboardEntry.objects
+        .filter(board=board, period=period)
+        .values("rank", "score", "player_id", username=F("player__user__username"))
+        .order_by("rank")
+    )
+
+
+def top_entries(board: str, period: str, limit: int) -> list:
+    return list(_entries(board, period).filter(rank__lte=limit))
+
+
+def entries_around(board: str, period: str, player_id: int, around: int) -> tuple:
+    """
+    (место игрока, строки от rank - around до rank + around).
+    Игрок ещё не попал в рейтинг — (None, []).
+    """
+    rank = (
+        LeaderboardEntry.objects
+        .filter(board=board, period=period, player_id=player_id)
+        .values_list("rank", flat=True)
+        .first()
+    )
+    if rank is None:
+        return None, []
+    return rank, list(_entries(board, period).filter(rank__range=(max(rank - around, 1), rank + around)))
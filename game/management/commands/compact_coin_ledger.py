@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from game.models import CoinBalanceSnapshot, CoinLedgerEntry
+
+
+class Command(BaseCommand):
+    help = "Сворачивает старые записи журнала монет в снимки баланса"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.COIN_LEDGER_RETENTION_DAYS,
+            help="Записи старше этого числа дней сворачиваются в снимок",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Игроков за транзакцию")
+
+    def handle(self, *args, days, batch_size, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+        old = CoinLedgerEntry.objects.filter(created_at__lt=cutoff)
+
+        players = 0
+        deleted = 0
+        last_player_id = 0
+        while True:
+            batch = list(
+                old.filter(player_id__gt=last_player_id)
+                .order_by("player_id")
+                .values_list("player_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not batch:
+                break
+            last_player_id = batch[-1]
+
+            with transaction.atomic():
+                # Баланс на cutoff = предыдущий снимок + записи до cutoff
+                opening = (
+                    CoinBalanceSnapshot.objects
+                    .filter(player_id=OuterRef("player_id"), taken_at__lte=cutoff)
+                    .order_by("-taken_at")
+                    .values("balance")[:1]
+                )
+                totals = (
+                    old.filter(player_id__in=batch)
+                    .values("player_id")
+                    .annotate(total=Sum("amount"), opening=Subquery(opening))
+                )
+                CoinBalanceSnapshot.objects.bulk_create([
+                    CoinBalanceSnapshot(
+                        player_id=row["player_id"],
+                        balance=(row["opening"] or 0) + row["total"],
+                        taken_at=cutoff,
+                    )
+                    for row in totals
+                ])
+                count, _ = old.filter(player_id__in=batch).delete()
+
+            players += len(batch)
+            deleted += count
+
+        self.stdout.write(f"Снимков: {players}, удалено записей журнала: {deleted}")
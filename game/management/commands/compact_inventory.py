@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from game.models import InventoryItem
+
+
+class Command(BaseCommand):
+    help = "Удаляет строки инвентаря, которые давно стоят с quantity=0"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.INVENTORY_EMPTY_RETENTION_DAYS,
+            help="Сколько дней строка должна простоять пустой",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, days, batch_size, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+        idle = InventoryItem.objects.filter(quantity=0, updated_at__lt=cutoff)
+
+        # Удаляем пачками, чтобы не держать долгих блокировок
+        deleted = 0
+        while True:
+            ids = list(idle.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            # quantity=0 ещё раз: строку могли пополнить между SELECT и DELETE
+            count, _ = InventoryItem.objects.filter(id__in=ids, quantity=0).delete()
+            deleted += count
+            if len(ids) < batch_size:
+                break
+
+        self.stdout.write(f"Удалено пустых строк инвентаря: {deleted}")
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from game.experience import flush_exp
+from game.models import ExpDelta
+
+
+class Command(BaseCommand):
+    help = "Применяет отложенный опыт (ExpDelta) к профилям и навыкам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=settings.EXP_FLUSH_MAX_AGE_SECONDS,
+            help="Только игроки, у которых есть записи старше стольких секунд (0 — все)",
+        )
+
+    def handle(self, *args, older_than, **options):
+        pending = ExpDelta.objects.all()
+        if older_than:
+            pending = pending.filter(created_at__lt=timezone.now() - timedelta(seconds=older_than))
+        user_ids = set(pending.values_list("user_id", flat=True).distinct())
+
+        flushed = 0
+        for user in get_user_model().objects.filter(id__in=user_ids).iterator():
+            if flush_exp(user) is not None:
+                flushed += 1
+
+        self.stdout.write(f"Применён отложенный опыт игроков: {flushed}")
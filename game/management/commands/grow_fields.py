@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from game.provisioning import grow_fields, users_missing_cells
+
+
+class Command(BaseCommand):
+    help = (
+        "Досоздаёт стартовые клетки поля после увеличения FIELD_ROWS/FIELD_COLS (пачками); "
+        "повторный запуск ничего не меняет"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, batch_size, **options):
+        missing = users_missing_cells().order_by("id")
+        total = missing.count()
+        if not total:
+            self.stdout.write("Поля всех игроков полные")
+            return
+
+        done = 0
+        last_id = 0
+        while True:
+            user_ids = list(missing.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size])
+            if not user_ids:
+                break
+            done += grow_fields(user_ids)
+            last_id = user_ids[-1]
+            self.stdout.write(f"Дополнено полей: {done}/{total}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from game.leaderboard import refresh_leaderboards
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает места в рейтингах (cron.sh minutely)"
+
+    def handle(self, *args, **options):
+        written = refresh_leaderboards()
+        if written is None:
+            self.stdout.write("Пересчёт рейтингов уже идёт, пропускаем")
+            return
+        self.stdout.write(f"Обновлено строк рейтингов: {written}")
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from game.catalog import get_catalog
+from game.models import PlayerProfile
+from game.skills import MODIFIERS_VERSION_KEY, refresh_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает skill_modifiers профилей после изменения навыков (пачками), "
+        "чтобы это не делали запросы игроков"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Проверить профили, даже если эта версия навыков уже применена",
+        )
+
+    def handle(self, *args, batch_size, force, **options):
+        version = get_catalog().skills_version
+        cache = caches[settings.CATALOG_CACHE]
+        # Запускается раз в минуту: без смены навыков таблицу профилей не сканируем
+        if not force and cache.get(MODIFIERS_VERSION_KEY) == version:
+            self.stdout.write("Модификаторы навыков актуальны")
+            return
+
+        stale = PlayerProfile.objects.exclude(skills_version=version)
+        total = stale.count()
+        if not total:
+            cache.set(MODIFIERS_VERSION_KEY, version, None)
+            self.stdout.write("Модификаторы навыков актуальны")
+            return
+
+        done = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                profiles = list(
+                    stale.filter(id__gt=last_id)
+                    .order_by("id")
+                    .select_for_update()
+                    .only("id", "user_id", "skills_version", "skill_modifiers")[:batch_size]
+                )
+                if not profiles:
+                    break
+                refresh_profiles(profiles)
+            done += len(profiles)
+            last_id = profiles[-1].id
+            self.stdout.write(f"Пересчитано профилей: {done}/{total}")
+        cache.set(MODIFIERS_VERSION_KEY, version, None)
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-16 22:58
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_ready_at(apps, schema_editor):
+    Cell = apps.get_model('game', 'Cell')
+    cells = Cell.objects.filter(
+        shop_item__isnull=False,
+        planted_at__isnull=False,
+        grow_duration_seconds__gt=0,
+    )
+    batch = []
+    for cell in cells.iterator(chunk_size=1000):
+        cell.ready_at = cell.planted_at + timedelta(seconds=cell.grow_duration_seconds)
+        batch.append(cell)
+        if len(batch) >= 1000:
+            Cell.objects.bulk_update(batch, ['ready_at'])
+            batch = []
+    if batch:
+        Cell.objects.bulk_update(batch, ['ready_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0023_itemcategory_shopitem_remove_harvestproduct_plant_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cell',
+            name='ready_at',
+            field=models.DateTimeField(blank=True, help_text='Когда урожай созреет (planted_at + grow_duration_seconds)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['owner', 'ready_at'], name='game_cell_owner_i_8e4413_idx'),
+        ),
+        migrations.RunPython(fill_ready_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-16 22:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0024_cell_ready_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cell',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['owner', 'updated_at'], name='game_cell_owner_i_a11e49_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-16 23:11
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Складывает дубли (player, item) в строку с наименьшим id,
+    остальные удаляет — перед уникальным ограничением в 0027.
+    """
+    InventoryItem = apps.get_model('game', 'InventoryItem')
+    groups = (
+        InventoryItem.objects
+        .filter(player__isnull=False, item__isnull=False)
+        .values('player_id', 'item_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in list(groups):
+        InventoryItem.objects.filter(id=group['keep_id']).update(quantity=group['total'])
+        InventoryItem.objects.filter(
+            player_id=group['player_id'], item_id=group['item_id'],
+        ).exclude(id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0025_cell_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-16 23:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0026_merge_duplicate_inventory_items'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='inventoryitem',
+            unique_together={('player', 'item')},
+        ),
+    ]
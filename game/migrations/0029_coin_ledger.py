@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-16 23:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0028_inventoryitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_snapshots', to='game.playerprofile')),
+            ],
+            options={
+                'verbose_name': 'Снимок баланса',
+                'verbose_name_plural': 'Снимки баланса',
+                'unique_together': {('player', 'taken_at')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CoinLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(help_text='Положительное — начисление, отрицательное — списание')),
+                ('reason', models.CharField(choices=[('buy', 'Покупка'), ('checkout', 'Покупка корзины'), ('auto_buy', 'Автопокупка семян'), ('sell', 'Продажа'), ('admin', 'Изменение в админке')], max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_ledger', to='game.playerprofile')),
+            ],
+            options={
+                'verbose_name': 'Движение монет',
+                'verbose_name_plural': 'Журнал монет',
+                'indexes': [models.Index(fields=['player', 'created_at'], name='game_coinle_player__fb5352_idx'), models.Index(fields=['created_at'], name='game_coinle_created_bb9be6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-16 23:32
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def create_opening_snapshots(apps, schema_editor):
+    """
+    Текущие балансы — начальная точка журнала монет
+    """
+    PlayerProfile = apps.get_model('game', 'PlayerProfile')
+    CoinBalanceSnapshot = apps.get_model('game', 'CoinBalanceSnapshot')
+    now = timezone.now()
+    profiles = PlayerProfile.objects.filter(coins_balance__gt=0).values_list('id', 'coins_balance')
+    CoinBalanceSnapshot.objects.bulk_create(
+        (
+            CoinBalanceSnapshot(player_id=player_id, balance=balance, taken_at=now)
+            for player_id, balance in profiles.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0029_coin_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
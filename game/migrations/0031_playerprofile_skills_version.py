@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0030_opening_coin_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerprofile',
+            name='skills_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0031_playerprofile_skills_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerprofile',
+            name='skill_modifiers',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-17 00:03
+
+from django.db import migrations
+
+
+def prune_empty_user_skills(apps, schema_editor):
+    """
+    Навыки хранятся разреженно: строка уровня 0 без опыта не нужна
+    """
+    UserSkill = apps.get_model('game', 'UserSkill')
+    UserSkill.objects.filter(level=0, exp=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0032_playerprofile_skill_modifiers'),
+    ]
+
+    operations = [
+        migrations.RunPython(prune_empty_user_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0034_expdelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerprofile',
+            name='harvest_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('level', 'Уровень'), ('coins', 'Монеты'), ('harvest', 'Урожай')], max_length=16)),
+                ('period', models.CharField(max_length=16)),
+                ('score', models.BigIntegerField()),
+                ('base', models.BigIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField()),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='game.playerprofile')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Рейтинги',
+                'indexes': [models.Index(fields=['board', 'period', 'rank'], name='game_leader_board_e53f7a_idx')],
+                'unique_together': {('board', 'period', 'player')},
+            },
+        ),
+    ]
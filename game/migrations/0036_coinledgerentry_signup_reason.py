@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0035_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coinledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('buy', 'Покупка'), ('checkout', 'Покупка корзины'), ('auto_buy', 'Автопокупка семян'), ('sell', 'Продажа'), ('admin', 'Изменение в админке'), ('signup', 'Стартовый баланс')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-17 02:14
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Max
+from django.utils import timezone
+
+
+def provision_existing_players(apps, schema_editor):
+    """
+    Профиль и поле для пользователей, созданных до provisioning.py
+    (раньше их создавал get_or_create на первом запросе).
+
+    Размер поля не берётся из настроек: каждому игроку достраиваем
+    прямоугольник до его собственных max(row) x max(col). Игроки без клеток
+    получат их при первом действии (create_cells).
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    PlayerProfile = apps.get_model('game', 'PlayerProfile')
+    Cell = apps.get_model('game', 'Cell')
+    now = timezone.now()
+
+    PlayerProfile.objects.bulk_create(
+        (
+            PlayerProfile(user_id=user_id)
+            for user_id in User.objects.filter(profile__isnull=True).values_list('id', flat=True).iterator()
+        ),
+        batch_size=1000,
+    )
+
+    extents = (
+        Cell.objects.values('owner_id')
+        .annotate(max_row=Max('row'), max_col=Max('col'))
+        .order_by('owner_id')
+        .values_list('owner_id', 'max_row', 'max_col')
+    )
+    batch = []
+    for owner_id, max_row, max_col in list(extents):
+        batch += [
+            Cell(owner_id=owner_id, row=row, col=col, updated_at=now)
+            for row in range(max_row + 1)
+            for col in range(max_col + 1)
+        ]
+        if len(batch) >= 1000:
+            # Уже созданные клетки пропускает unique (owner, row, col)
+            Cell.objects.bulk_create(batch, batch_size=1000, ignore_conflicts=True)
+            batch = []
+    Cell.objects.bulk_create(batch, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0036_coinledgerentry_signup_reason'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(provision_existing_players, migrations.RunPython.noop),
+    ]
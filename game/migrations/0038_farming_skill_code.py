@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 03:05
+
+from django.db import migrations
+
+FARMING_SKILL_CODE = 'farming'
+FARMING_SKILL_NAME = 'Земледелие'
+
+
+def set_farming_skill_code(apps, schema_editor):
+    """
+    Раньше навык земледелия искали по имени, теперь — по Skill.code
+    (skills.FARMING_SKILL_CODE): проставляем код навыку «Земледелие»
+    """
+    Skill = apps.get_model('game', 'Skill')
+    if Skill.objects.filter(code=FARMING_SKILL_CODE).exists():
+        return
+
+    skills = list(Skill.objects.filter(name=FARMING_SKILL_NAME))
+    if len(skills) > 1:
+        raise RuntimeError(
+            f'Несколько навыков «{FARMING_SKILL_NAME}»: задайте одному из них code="{FARMING_SKILL_CODE}"'
+        )
+    if skills:
+        skills[0].code = FARMING_SKILL_CODE
+        skills[0].save(update_fields=['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0037_provision_existing_players'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_farming_skill_code, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-17 03:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def merge_exp_deltas(apps, schema_editor):
+    """
+    Строки буфера (по одной на начисление) → одна строка на (игрок, цель)
+    """
+    ExpDelta = apps.get_model('game', 'ExpDelta')
+    merged = {}
+    for row in ExpDelta.objects.order_by('id').iterator():
+        key = (row.user_id, row.skill_id or 0)
+        if key in merged:
+            first = merged[key]
+            first.amount += row.amount
+            first.grants += 1
+            first.created_at = min(first.created_at, row.created_at)
+            row.delete()
+        else:
+            row.target = row.skill_id or 0
+            row.grants = 1
+            merged[key] = row
+    ExpDelta.objects.bulk_update(merged.values(), ['target', 'amount', 'grants', 'created_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0038_farming_skill_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expdelta',
+            name='grants',
+            field=models.PositiveIntegerField(default=0, help_text='Сколько начислений сложено'),
+        ),
+        migrations.AddField(
+            model_name='expdelta',
+            name='target',
+            field=models.PositiveIntegerField(default=0, help_text='0 — опыт профиля, иначе Skill.id'),
+        ),
+        migrations.AlterField(
+            model_name='expdelta',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Первое начисление'),
+        ),
+        migrations.RunPython(merge_exp_deltas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 03:31
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0039_expdelta_target'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expdelta',
+            name='game_expdel_user_id_3dd676_idx',
+        ),
+        migrations.RemoveField(
+            model_name='expdelta',
+            name='skill',
+        ),
+        migrations.AlterUniqueTogether(
+            name='expdelta',
+            unique_together={('user', 'target')},
+        ),
+    ]
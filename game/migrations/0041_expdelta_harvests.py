@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0040_expdelta_unique_target'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expdelta',
+            name='harvests',
+            field=models.PositiveIntegerField(default=0, help_text='Собрано урожая (только в строке профиля)'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .progression import add_profile_exp, add_skill_exp, skill_exp_to_next
+
 User = settings.AUTH_USER_MODEL
 
 # =========================
@@ -17,6 +19,11 @@ class PlayerProfile(models.Model):
     coins_balance = models.PositiveIntegerField(default=0)
     level = models.PositiveIntegerField(default=1)
     exp = models.PositiveIntegerField(default=0)
+    # Собрано клеток за всё время (рейтинг «Урожай», см. leaderboard.py)
+    harvest_count = models.PositiveIntegerField(default=0)
+    # Catalog.skills_version, для которой посчитаны skill_modifiers (см. skills.py)
+    skills_version = models.CharField(max_length=32, blank=True, default="")
+    skill_modifiers = models.JSONField(default=dict, blank=True)
 
     class Meta:
         verbose_name = "Профиль игрока"
@@ -67,30 +74,13 @@ class ShopItem(models.Model):
     
 # ===== Опыт и уровни =====
 
-def exp_for_level(level: int) -> int:
-    """
-    Общее количество опыта, необходимое для достижения level.
-    Формула: 50 * level * (level - 1) / 2
-    """
-    return 50 * level * (level - 1) // 2
-
-
-def recalc_level(profile: PlayerProfile) -> None:
-    total_exp = profile.exp
-    level = 1
-
-    while total_exp >= exp_for_level(level + 1):
-        level += 1
-
-    profile.level = level
-
+# Формулы и таблицы уровней — в progression.py
 
 def add_exp(profile: PlayerProfile, amount: int) -> None:
     if amount <= 0:
         return
 
-    profile.exp += amount
-    recalc_level(profile)
+    add_profile_exp(profile, amount)
     profile.save(update_fields=["exp", "level"])
 
 
@@ -115,24 +105,43 @@ class Cell(models.Model):
         blank=True,
         help_text="Фактическое время роста с учетом навыков",
     )
+    ready_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Когда урожай созреет (planted_at + grow_duration_seconds)",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("owner", "row", "col")
-        indexes = [models.Index(fields=["owner"])]
+        indexes = [
+            models.Index(fields=["owner"]),
+            models.Index(fields=["owner", "ready_at"]),
+            models.Index(fields=["owner", "updated_at"]),
+        ]
 
     @property
     def is_growing(self) -> bool:
         return self.shop_item_id is not None and self.planted_at is not None and self.shop_item.is_seed
 
-    @property
-    def ready_at(self):
-        if not self.is_growing or not self.grow_duration_seconds:
-            return None
-        return self.planted_at + timezone.timedelta(seconds=self.grow_duration_seconds)
-
     @property
     def is_ready_for_harvest(self) -> bool:
-        return self.is_growing and self.ready_at and timezone.now() >= self.ready_at
+        return self.is_growing and self.ready_at is not None and timezone.now() >= self.ready_at
+
+    # updated_at выставляем явно: bulk_update не вызывает auto_now
+    def plant(self, shop_item: ShopItem, duration_seconds: int) -> None:
+        self.shop_item = shop_item
+        self.planted_at = timezone.now()
+        self.grow_duration_seconds = duration_seconds
+        self.ready_at = self.planted_at + timezone.timedelta(seconds=duration_seconds)
+        self.updated_at = self.planted_at
+
+    def clear(self) -> None:
+        self.shop_item = None
+        self.planted_at = None
+        self.grow_duration_seconds = None
+        self.ready_at = None
+        self.updated_at = timezone.now()
 
     @property
     def harvest_item(self):
@@ -143,6 +152,18 @@ class Cell(models.Model):
             return self.shop_item.harvest_item
         return None
 
+def next_ready_at(user):
+    """
+    Ближайшее время созревания среди растущих клеток игрока (индекс owner, ready_at)
+    """
+    return (
+        Cell.objects
+        .filter(owner=user, ready_at__gt=timezone.now())
+        .order_by("ready_at")
+        .values_list("ready_at", flat=True)
+        .first()
+    )
+
 # =========================
 # Инвентарь
 # =========================
@@ -151,10 +172,80 @@ class InventoryItem(models.Model):
     item = models.ForeignKey(ShopItem, on_delete=models.CASCADE, null=True)
     player = models.ForeignKey(PlayerProfile, on_delete=models.CASCADE, null=True)
     quantity = models.PositiveIntegerField(default=0)
+    # Выставляется явно в economy.py: UPDATE/upsert не вызывают auto_now
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Одна строка на предмет: пополнение идёт через upsert (см. economy.py).
+        # Строки с quantity=0 не удаляем (см. команду compact_inventory)
+        unique_together = ("player", "item")
+        indexes = [
+            models.Index(
+                fields=["player", "item"],
+                condition=models.Q(quantity__gt=0),
+                name="game_inventory_in_stock_idx",
+            ),
+            models.Index(
+                fields=["updated_at"],
+                condition=models.Q(quantity=0),
+                name="game_inventory_empty_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.item.name} x{self.quantity}"
 
+# =========================
+# Журнал монет
+# =========================
+
+class CoinLedgerEntry(models.Model):
+    """
+    Движение монет (append-only). Пишется в той же транзакции,
+    что и изменение PlayerProfile.coins_balance (см. economy.py).
+    """
+    class Reason(models.TextChoices):
+        BUY = "buy", "Покупка"
+        CHECKOUT = "checkout", "Покупка корзины"
+        AUTO_BUY = "auto_buy", "Автопокупка семян"
+        SELL = "sell", "Продажа"
+        ADMIN = "admin", "Изменение в админке"
+        SIGNUP = "signup", "Стартовый баланс"
+
+    player = models.ForeignKey(PlayerProfile, on_delete=models.CASCADE, related_name="coin_ledger")
+    amount = models.IntegerField(help_text="Положительное — начисление, отрицательное — списание")
+    reason = models.CharField(max_length=16, choices=Reason.choices)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Движение монет"
+        verbose_name_plural = "Журнал монет"
+        indexes = [
+            models.Index(fields=["player", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id}: {self.amount:+d} ({self.reason})"
+
+
+class CoinBalanceSnapshot(models.Model):
+    """
+    Баланс игрока на момент taken_at: сюда compact_coin_ledger сворачивает
+    старые записи журнала. Баланс = последний снимок + записи после него.
+    """
+    player = models.ForeignKey(PlayerProfile, on_delete=models.CASCADE, related_name="coin_snapshots")
+    balance = models.BigIntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Снимок баланса"
+        verbose_name_plural = "Снимки баланса"
+        unique_together = ("player", "taken_at")
+
+    def __str__(self):
+        return f"{self.player_id}: {self.balance} @ {self.taken_at:%Y-%m-%d}"
+
 # =========================
 # Навыки
 # =========================
@@ -180,9 +271,7 @@ class Skill(models.Model):
         return self.name
 
     def required_exp_for_level(self, level: int) -> int:
-        if level >= self.max_level:
-            return 0
-        return int(self.base_exp * (self.exp_growth ** level))
+        return skill_exp_to_next(self, level)
 
 
 class UserSkill(models.Model):
@@ -195,49 +284,72 @@ class UserSkill(models.Model):
     class Meta:
         unique_together = ("user", "skill")
 
-    def add_exp(self, amount: int) -> None:
+    def add_exp(self, amount: int, save: bool = True) -> bool:
+        """
+        True — если изменился уровень (нужно пересчитать skill_modifiers профиля)
+        """
         if amount <= 0 or self.level >= self.skill.max_level:
-            return
-
-        self.exp += amount
-
-        while self.level < self.skill.max_level:
-            need = self.skill.required_exp_for_level(self.level)
-            if self.exp < need or need == 0:
-                break
-            self.exp -= need
-            self.level += 1
+            return False
 
-        if self.level >= self.skill.max_level:
-            self.exp = 0
+        level_changed = add_skill_exp(self, amount)
 
-        self.save()
+        if save:
+            self.save()
+        return level_changed
 
     @property
     def exp_to_next(self) -> int:
-        if self.level >= self.skill.max_level:
-            return 0
-        return self.skill.required_exp_for_level(self.level)
+        return skill_exp_to_next(self.skill, self.level)
 
 
-def ensure_user_skills(user):
+class ExpDelta(models.Model):
     """
-    Создаёт недостающие навыки для пользователя
+    Начисленный, но ещё не применённый опыт (буфер, см. experience.py).
+    Одна строка на (игрок, цель): начисления складываются upsert'ом.
+    Строка профиля копит и собранный урожай (PlayerProfile.harvest_count).
     """
-    existing_ids = set(
-        UserSkill.objects.filter(user=user)
-        .values_list("skill_id", flat=True)
-    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Без внешнего ключа: опыт удалённого навыка просто пропадёт при применении
+    target = models.PositiveIntegerField(default=0, help_text="0 — опыт профиля, иначе Skill.id")
+    amount = models.PositiveIntegerField()
+    grants = models.PositiveIntegerField(default=0, help_text="Сколько начислений сложено")
+    harvests = models.PositiveIntegerField(default=0, help_text="Собрано урожая (только в строке профиля)")
+    created_at = models.DateTimeField(default=timezone.now, help_text="Первое начисление")
 
-    skills = Skill.objects.exclude(id__in=existing_ids)
+    class Meta:
+        unique_together = ("user", "target")
 
-    UserSkill.objects.bulk_create(
-        [UserSkill(user=user, skill=skill) for skill in skills]
-    )
 
-    return (
-        UserSkill.objects
-        .select_related("skill")
-        .filter(user=user)
-        .order_by("skill__id")
-    )
\ No newline at end of file
+# =========================
+# Рейтинги
+# =========================
+
+class LeaderboardEntry(models.Model):
+    """
+    Место игрока в рейтинге. Пересчитывается командой refresh_leaderboards
+    (см. leaderboard.py); запросы читают только эту таблицу.
+    """
+    class Board(models.TextChoices):
+        LEVEL = "level", "Уровень"
+        COINS = "coins", "Монеты"
+        HARVEST = "harvest", "Урожай"
+
+    board = models.CharField(max_length=16, choices=Board.choices)
+    # "all" — за всё время, иначе неделя ISO: "2026-W42"
+    period = models.CharField(max_length=16)
+    player = models.ForeignKey(PlayerProfile, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    score = models.BigIntegerField()
+    # Очки за всё время на начало недели: недельные очки = текущие - base
+    base = models.BigIntegerField(default=0)
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = "Место в рейтинге"
+        verbose_name_plural = "Рейтинги"
+        unique_together = ("board", "period", "player")
+        indexes = [
+            models.Index(fields=["board", "period", "rank"]),
+        ]
+
+    def __str__(self):
+        return f"{self.board}/{self.period} #{self.rank}: {self.player_id} ({self.score})"
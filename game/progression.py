@@ -0,0 +1,106 @@
+"""
+Опыт и уровни профиля и навыков.
+
+Накопленный опыт по уровням считается один раз на воркер (таблицы),
+уровень по опыту ищется через bisect — крупное начисление (события,
+админка, сбор всего поля) стоит столько же, сколько мелкое.
+
+В profile.exp и UserSkill.exp хранится опыт внутри текущего уровня.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+
+# Дальше этого уровня профиль не растёт, опыт копится в exp
+PROFILE_LEVEL_CAP = 1000
+
+
+# =========================
+# Профиль
+# =========================
+
+def profile_exp_to_next(level: int) -> int:
+    """
+    Опыт для перехода с level на level + 1
+    """
+    return level * 100
+
+
+@lru_cache(maxsize=1)
+def profile_table() -> tuple:
+    """
+    table[level - 1] — накопленный опыт, с которым достигается level
+    """
+    table = [0]
+    for level in range(1, PROFILE_LEVEL_CAP):
+        table.append(table[-1] + profile_exp_to_next(level))
+    return tuple(table)
+
+
+def add_profile_exp(profile, amount: int) -> bool:
+    """
+    Начисляет опыт профилю без сохранения. True — если уровень изменился.
+    """
+    if amount <= 0:
+        return False
+
+    table = profile_table()
+    level = min(profile.level, PROFILE_LEVEL_CAP)
+    total = table[level - 1] + profile.exp + amount
+
+    new_level = min(bisect_right(table, total), PROFILE_LEVEL_CAP)
+    profile.exp = total - table[new_level - 1]
+    changed = new_level != profile.level
+    profile.level = new_level
+    return changed
+
+
+# =========================
+# Навыки
+# =========================
+
+@lru_cache(maxsize=256)
+def skill_table(max_level: int, base_exp: int, exp_growth: float) -> tuple:
+    """
+    table[level] — накопленный опыт, с которым достигается level.
+    Ключ кэша — параметры навыка: после правки Skill таблица строится заново.
+    Уровень, для которого нужно 0 опыта, недостижим — таблица на нём обрывается.
+    """
+    table = [0]
+    for level in range(max_level):
+        need = int(base_exp * (exp_growth ** level))
+        if need <= 0:
+            break
+        table.append(table[-1] + need)
+    return tuple(table)
+
+
+def _table_for(skill) -> tuple:
+    return skill_table(skill.max_level, skill.base_exp, skill.exp_growth)
+
+
+def skill_exp_to_next(skill, level: int) -> int:
+    table = _table_for(skill)
+    if level >= skill.max_level or level + 1 >= len(table):
+        return 0
+    return table[level + 1] - table[level]
+
+
+def add_skill_exp(user_skill, amount: int) -> bool:
+    """
+    Начисляет опыт навыку без сохранения. True — если уровень изменился.
+    На максимальном уровне опыт обнуляется.
+    """
+    skill = user_skill.skill
+    if amount <= 0 or user_skill.level >= skill.max_level:
+        return False
+
+    table = _table_for(skill)
+    top = len(table) - 1
+    level = min(user_skill.level, top)
+    total = table[level] + user_skill.exp + amount
+
+    new_level = min(bisect_right(table, total) - 1, top)
+    user_skill.exp = 0 if new_level >= skill.max_level else total - table[new_level]
+    changed = new_level != user_skill.level
+    user_skill.level = new_level
+    return changed
@@ -0,0 +1,108 @@
+"""
+Создание игрока: профиль, стартовые монеты и инвентарь, поле
+FIELD_ROWS x FIELD_COLS — bulk-вставками в транзакции создания пользователя
+(сигнал post_save для User, см. signals.py; регистрация — RegisterSerializer).
+
+После этого горячие пути считают, что профиль и клетки поля есть, и не
+делают get_or_create. Навыки хранятся разреженно (skills.py): строки
+UserSkill здесь не создаются.
+
+Стартовое поле — не граница: клетку за его пределами (но в пределах
+FIELD_MAX_ROWS x FIELD_MAX_COLS) создаёт первое действие с ней (create_cells).
+Если FIELD_ROWS/FIELD_COLS увеличили, стартовые клетки уже созданных
+игроков добавляет команда grow_fields.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import Cell, CoinLedgerEntry, InventoryItem, PlayerProfile
+
+
+def field_coords() -> list:
+    return [(row, col) for row in range(settings.FIELD_ROWS) for col in range(settings.FIELD_COLS)]
+
+
+def field_contains(row: int, col: int) -> bool:
+    return 0 <= row < settings.FIELD_MAX_ROWS and 0 <= col < settings.FIELD_MAX_COLS
+
+
+def create_cells(user, coords) -> None:
+    """
+    Недостающие клетки {(row, col)} одной вставкой; существующие
+    пропускает unique (owner, row, col)
+    """
+    now = timezone.now()
+    Cell.objects.bulk_create(
+        [Cell(owner=user, row=row, col=col, updated_at=now) for row, col in coords],
+        ignore_conflicts=True,
+    )
+
+
+def starting_inventory() -> dict:
+    """
+    STARTING_INVENTORY {slug: quantity} → {item_id: quantity}; неизвестные slug пропускаются
+    """
+    by_slug = get_catalog().by_slug
+    return {
+        by_slug[slug].id: quantity
+        for slug, quantity in settings.STARTING_INVENTORY.items()
+        if slug in by_slug and quantity > 0
+    }
+
+
+def provision_player(user) -> PlayerProfile:
+    """
+    Всё, что нужно новому игроку. Одна вставка на таблицу.
+    """
+    with transaction.atomic(savepoint=False):
+        profile = PlayerProfile.objects.create(user=user, coins_balance=settings.STARTING_COINS)
+        if settings.STARTING_COINS:
+            CoinLedgerEntry.objects.create(
+                player=profile, amount=settings.STARTING_COINS, reason=CoinLedgerEntry.Reason.SIGNUP
+            )
+
+        now = timezone.now()
+        InventoryItem.objects.bulk_create([
+            InventoryItem(player=profile, item_id=item_id, quantity=quantity, updated_at=now)
+            for item_id, quantity in starting_inventory().items()
+        ])
+        Cell.objects.bulk_create([
+            Cell(owner=user, row=row, col=col, updated_at=now)
+            for row, col in field_coords()
+        ])
+    return profile
+
+
+def users_missing_cells():
+    """
+    Пользователи, у которых клеток в пределах поля меньше, чем FIELD_ROWS x FIELD_COLS
+    """
+    in_bounds = Q(cell__row__lt=settings.FIELD_ROWS, cell__col__lt=settings.FIELD_COLS)
+    return (
+        get_user_model().objects
+        .annotate(cells=Count("cell", filter=in_bounds))
+        .filter(cells__lt=settings.FIELD_ROWS * settings.FIELD_COLS)
+    )
+
+
+def grow_fields(user_ids) -> int:
+    """
+    Досоздаёт недостающие клетки поля одной вставкой. Уже существующие
+    пропускает unique (owner, row, col) — повторный вызов ничего не меняет.
+    Возвращает число пользователей.
+    """
+    now = timezone.now()
+    Cell.objects.bulk_create(
+        [
+            Cell(owner_id=user_id, row=row, col=col, updated_at=now)
+            for user_id in user_ids
+            for row, col in field_coords()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return len(user_ids)
@@ -1,10 +1,12 @@
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 from django.utils.timezone import timedelta
 
+from .catalog import get_catalog
 from .models import (
-    PlayerProfile, Cell, InventoryItem, ShopItem, ItemCategory
+    PlayerProfile, Cell, InventoryItem, ShopItem, ItemCategory, CoinLedgerEntry
 )
 
 # =========================
@@ -17,7 +19,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ("username", "email", "password")
 
+    @transaction.atomic
     def create(self, validated_data):
+        # Профиль, инвентарь и поле — в той же транзакции (signals → provisioning.py)
         return User.objects.create_user(
             username=validated_data["username"],
             email=validated_data.get("email", ""),
@@ -32,6 +36,14 @@ class PlayerProfileSerializer(serializers.ModelSerializer):
         model = PlayerProfile
         fields = ("coins_balance", "level", "exp")
 
+# =========================
+# Журнал монет
+# =========================
+class CoinLedgerEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CoinLedgerEntry
+        fields = ("id", "amount", "reason", "created_at")
+
 # =========================
 # Категории товаров
 # =========================
@@ -85,19 +97,32 @@ class CellSerializer(serializers.ModelSerializer):
             "ready_at", "remaining_seconds", "is_ready"
         )
 
+    @staticmethod
+    def growing_seed(obj):
+        """Посаженное семя из каталога (без запроса к БД)"""
+        if obj.shop_item_id is None or obj.planted_at is None:
+            return None
+        seed = get_catalog().items.get(obj.shop_item_id) or obj.shop_item
+        return seed if seed is not None and seed.is_seed else None
+
+    @staticmethod
+    def ready_for_harvest(obj, seed) -> bool:
+        return seed is not None and obj.ready_at is not None and timezone.now() >= obj.ready_at
+
     def get_plant(self, obj):
-        if not obj.shop_item or not obj.shop_item.is_seed:
+        seed = self.growing_seed(obj)
+        if seed is None:
             return None
         
         # ✅ ГОТОВО: используем harvest_slug вместо slug семян!
-        if obj.is_ready_for_harvest and obj.shop_item.harvest_item:
-            harvest = obj.shop_item.harvest_item
+        if self.ready_for_harvest(obj, seed) and seed.harvest_item:
+            harvest = seed.harvest_item
             return {
-                "id": obj.shop_item.id,
+                "id": seed.id,
                 "name": harvest.name,           # "Пшеница"
-                "description": f"×{obj.shop_item.harvest_yield} шт. Продажа: {harvest.price_coins} монет/шт.",
-                "grow_time_minutes": obj.shop_item.grow_time_minutes,
-                "seed_price": obj.shop_item.price_coins,
+                "description": f"×{seed.harvest_yield} шт. Продажа: {harvest.price_coins} монет/шт.",
+                "grow_time_minutes": seed.grow_time_minutes,
+                "seed_price": seed.price_coins,
                 "slug": harvest.slug,           # ✅ "wheat-harvest" !!!
                 "type": "harvest",
                 "is_ready": True
@@ -105,44 +130,45 @@ class CellSerializer(serializers.ModelSerializer):
         
         # РАСТЕТ: slug семян
         return {
-            "id": obj.shop_item.id,
-            "name": obj.shop_item.name,     # "Семена пшеницы"
-            "description": obj.shop_item.description or "Посажено",
-            "grow_time_minutes": obj.shop_item.grow_time_minutes,
-            "seed_price": obj.shop_item.price_coins,
-            "slug": obj.shop_item.slug,     # "wheat"
+            "id": seed.id,
+            "name": seed.name,     # "Семена пшеницы"
+            "description": seed.description or "Посажено",
+            "grow_time_minutes": seed.grow_time_minutes,
+            "seed_price": seed.price_coins,
+            "slug": seed.slug,     # "wheat"
             "type": "seed", 
             "is_ready": False
         }
 
     def get_harvest(self, obj):
         """✅ Урожай (когда готово)"""
-        if not obj.is_ready_for_harvest or not obj.shop_item.harvest_item:
+        seed = self.growing_seed(obj)
+        if not self.ready_for_harvest(obj, seed) or not seed.harvest_item:
             return None
-        harvest = obj.shop_item.harvest_item
+        harvest = seed.harvest_item
         return {
             "id": harvest.id,
             "name": harvest.name,
             "description": getattr(harvest, "description", f"Продажа: {harvest.price_coins} монет"),
             "sell_price": harvest.price_coins,
-            "yield_quantity": obj.shop_item.harvest_yield or 1,
+            "yield_quantity": seed.harvest_yield or 1,
             "image_url": f"/static/plants/{harvest.slug}.png",
             "type": "harvest"
         }
 
     def get_ready_at(self, obj):
-        if not obj.planted_at or obj.grow_duration_seconds is None:
+        if obj.ready_at is None:
             return None
-        return (obj.planted_at + timezone.timedelta(seconds=obj.grow_duration_seconds)).isoformat()
+        return obj.ready_at.isoformat()
 
     def get_remaining_seconds(self, obj):
-        if not obj.planted_at or obj.grow_duration_seconds is None:
+        if obj.ready_at is None:
             return None
-        remaining = (obj.planted_at + timezone.timedelta(seconds=obj.grow_duration_seconds) - timezone.now()).total_seconds()
+        remaining = (obj.ready_at - timezone.now()).total_seconds()
         return max(int(remaining), 0)
 
     def get_is_ready(self, obj):
-        return obj.is_ready_for_harvest
+        return self.ready_for_harvest(obj, self.growing_seed(obj))
 
 # =========================
 # Инвентарь игрока
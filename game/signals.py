@@ -1,10 +1,35 @@
-from django.db.models.signals import post_save
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from .models import ensure_user_skills
+from .authentication import invalidate_principal
+from .catalog import invalidate_catalog
+from .provisioning import provision_player
+from .models import ItemCategory, PlayerProfile, ShopItem, Skill
+
+@receiver(post_save, sender=ShopItem)
+@receiver(post_delete, sender=ShopItem)
+@receiver(post_save, sender=ItemCategory)
+@receiver(post_delete, sender=ItemCategory)
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def invalidate_shop_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+@receiver(post_save, sender=User)
+def provision_new_player(sender, instance, created, raw=False, **kwargs):
+    # Профиль и поле создаются вместе с пользователем — откуда бы он ни появился
+    if created and not raw:
+        provision_player(instance)
 
 @receiver(post_save, sender=User)
-def create_user_skills(sender, instance, created, **kwargs):
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+# Принципал хранит только id профиля: важны лишь создание и удаление
+@receiver(post_save, sender=PlayerProfile)
+@receiver(post_delete, sender=PlayerProfile)
+def invalidate_profile_principal(sender, instance, created=True, **kwargs):
     if created:
-        ensure_user_skills(instance)
\ No newline at end of file
+        invalidate_principal(instance.user_id)
@@ -0,0 +1,148 @@
+"""
+Навыки игрока: разреженное хранение UserSkill и модификаторы эффектов.
+
+Строка UserSkill появляется, только когда навык получил опыт; отсутствующая
+строка означает уровень 0 без опыта. Загрузка навыков — один запрос по
+индексу (user, skill), недостающие навыки дополняются из каталога в памяти.
+
+Эффекты навыков (по Skill.code) хранятся готовыми в
+PlayerProfile.skill_modifiers и пересчитываются только при смене уровня
+навыка или версии каталога навыков (PlayerProfile.skills_version).
+"""
+from .catalog import get_catalog
+from .models import PlayerProfile, UserSkill
+
+# Версия навыков, до которой refresh_skill_modifiers уже довёл все профили
+# (в CATALOG_CACHE): пока она не сменилась, команда не сканирует профили
+MODIFIERS_VERSION_KEY = "game:skills:modifiers_version"
+
+
+def load_user_skills(user, profile: PlayerProfile) -> list:
+    """
+    Все навыки каталога в порядке Skill.id: сохранённые строки игрока
+    и несохранённые UserSkill уровня 0 для остальных
+    """
+    catalog = get_catalog()
+    stored = {
+        user_skill.skill_id: user_skill
+        for user_skill in UserSkill.objects.filter(user=user, skill_id__in=catalog.skills_by_id)
+    }
+    user_skills = _with_catalog_skills(catalog, stored, user=user)
+
+    if profile.skills_version != catalog.skills_version:
+        refresh_modifiers(profile, user_skills)
+        profile.skills_version = catalog.skills_version
+        PlayerProfile.objects.filter(id=profile.id).update(
+            skills_version=profile.skills_version,
+            skill_modifiers=profile.skill_modifiers,
+        )
+    return user_skills
+
+
+def _with_catalog_skills(catalog, stored: dict, **owner) -> list:
+    """
+    Сохранённые строки {skill_id: UserSkill} + уровень 0 для остальных навыков каталога
+    """
+    user_skills = []
+    field = UserSkill._meta.get_field("skill")
+    for skill in catalog.skills:
+        user_skill = stored.get(skill.id)
+        if user_skill is None:
+            user_skill = UserSkill(skill=skill, **owner)
+        else:
+            field.set_cached_value(user_skill, skill)
+        user_skills.append(user_skill)
+    return user_skills
+
+
+def refresh_profiles(profiles) -> None:
+    """
+    Пересчитывает и сохраняет модификаторы пачки профилей под текущий каталог
+    навыков: один SELECT строк UserSkill и один bulk_update.
+    Профили должны быть заблокированы вызывающим (select_for_update).
+    """
+    catalog = get_catalog()
+    stored = {}
+    for user_skill in UserSkill.objects.filter(
+        user_id__in=[profile.user_id for profile in profiles], skill_id__in=catalog.skills_by_id
+    ):
+        stored.setdefault(user_skill.user_id, {})[user_skill.skill_id] = user_skill
+
+    for profile in profiles:
+        user_skills = _with_catalog_skills(catalog, stored.get(profile.user_id, {}), user_id=profile.user_id)
+        refresh_modifiers(profile, user_skills)
+        profile.skills_version = catalog.skills_version
+    PlayerProfile.objects.bulk_update(profiles, ["skills_version", "skill_modifiers"])
+
+
+def save_user_skills(user_skills) -> None:
+    """
+    Сохраняет уровень и опыт навыков; для навыков без строки — INSERT,
+    при гонке с параллельным запросом — ON CONFLICT DO UPDATE
+    """
+    new = []
+    for user_skill in user_skills:
+        if user_skill.pk is None:
+            new.append(user_skill)
+        else:
+            user_skill.save(update_fields=["level", "exp"])
+    if new:
+        UserSkill.objects.bulk_create(
+            new,
+            update_conflicts=True,
+            unique_fields=["user", "skill"],
+            update_fields=["level", "exp"],
+        )
+
+
+# =========================
+# Эффекты навыков
+# =========================
+
+FARMING_SKILL_CODE = "farming"
+
+# Предел значения эффекта по Skill.code; нет записи — без ограничения
+EFFECT_CAPS = {
+    FARMING_SKILL_CODE: 75,  # ускорение роста: максимум -75%
+}
+
+NO_EFFECT = {"level": 0, "per_level": 0, "value": 0}
+
+
+def resolve_modifiers(user_skills) -> dict:
+    """
+    {code: {"level", "per_level", "value"}}, value = level * effect_value_per_level с пределом
+    """
+    modifiers = {}
+    for user_skill in user_skills:
+        skill = user_skill.skill
+        value = user_skill.level * skill.effect_value_per_level
+        cap = EFFECT_CAPS.get(skill.code)
+        if cap is not None:
+            value = min(value, cap)
+        modifiers[skill.code] = {
+            "level": user_skill.level,
+            "per_level": skill.effect_value_per_level,
+            "value": value,
+        }
+    return modifiers
+
+
+def refresh_modifiers(profile: PlayerProfile, user_skills) -> None:
+    """
+    Пересчитывает profile.skill_modifiers без сохранения
+    """
+    profile.skill_modifiers = resolve_modifiers(user_skills)
+
+
+def skill_modifiers(user, profile: PlayerProfile) -> dict:
+    """
+    Модификаторы игрока. Навыки загружаются, только если кэш в профиле устарел.
+    """
+    if profile.skills_version != get_catalog().skills_version:
+        load_user_skills(user, profile)
+    return profile.skill_modifiers
+
+
+def skill_effect(modifiers: dict, code: str) -> dict:
+    return modifiers.get(code, NO_EFFECT)
@@ -1,3 +1,757 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .authentication import clear_principals
+from .catalog import VERSION_KEY, attach_items, get_catalog, invalidate_catalog
+from .economy import ledger_balance
+from .experience import flush_exp
+from .leaderboard import REFRESH_LOCK_ID
+from .models import (
+    PlayerProfile, ItemCategory, ShopItem, Cell, InventoryItem, Skill,
+    CoinLedgerEntry, CoinBalanceSnapshot, UserSkill, ExpDelta, LeaderboardEntry,
+)
+from .progression import add_profile_exp, add_skill_exp
+from .skills import MODIFIERS_VERSION_KEY, load_user_skills
+from .throttling import LocalBucketBackend, get_backend
+
+# Сколько строк каждого вида создаём: при N+1 запросов было бы больше бюджета
+ROWS = 6
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FIELD_ROWS=2, FIELD_COLS=ROWS)
+class QueryBudgetTests(TestCase):
+    """
+    Бюджет SQL-запросов для каждого эндпоинта из farmotoria_backend/urls.py.
+    Число запросов не должно зависеть от количества клеток/товаров/инвентаря.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seeds = ItemCategory.objects.create(name="Seeds")
+        harvest = ItemCategory.objects.create(name="Harvest")
+
+        cls.seeds = []
+        cls.harvest = []
+        for i in range(ROWS):
+            crop = ShopItem.objects.create(
+                name=f"Урожай {i}", slug=f"crop-{i}", category=harvest,
+                is_harvest=True, price_coins=5,
+            )
+            seed = ShopItem.objects.create(
+                name=f"Семена {i}", slug=f"seed-{i}", category=seeds,
+                is_seed=True, price_coins=3, grow_time_minutes=1,
+                harvest_yield=2, harvest_item=crop,
+            )
+            cls.harvest.append(crop)
+            cls.seeds.append(seed)
+
+        Skill.objects.create(
+            code="farming", name="Земледелие",
+            effect_name="Ускорение роста", effect_value_per_level=5,
+        )
+
+        cls.user = User.objects.create_user("farmer", password="secret123")
+        cls.profile = cls.user.profile
+        cls.profile.coins_balance = 1000
+        cls.profile.save()
+        # Модификаторы навыков считаются один раз, дальше — одно чтение
+        load_user_skills(cls.user, cls.profile)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Каталог загружается один раз на воркер — в бюджет не входит
+        get_catalog()
+        # Вёдра лимитов живут в памяти процесса — не переносим между тестами
+        get_backend().clear()
+
+    def fill_field(self, ready=True):
+        ready_at = timezone.now() + (timedelta(minutes=-1) if ready else timedelta(hours=1))
+        for i, seed in enumerate(self.seeds):
+            Cell.objects.filter(owner=self.user, row=0, col=i).update(
+                shop_item=seed, planted_at=ready_at - timedelta(minutes=1),
+                grow_duration_seconds=60, ready_at=ready_at,
+            )
+
+    def fill_inventory(self):
+        for item in self.seeds + self.harvest:
+            InventoryItem.objects.create(player=self.profile, item=item, quantity=10)
+
+    def assertQueryBudget(self, budget, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertLessEqual(
+            len(ctx), budget,
+            f"{method.upper()} {url}: {len(ctx)} запросов при бюджете {budget}\n"
+            + "\n".join(q["sql"] for q in ctx.captured_queries)
+        )
+        return response
+
+    # ===== Профиль и авторизация =====
+
+    def test_ping(self):
+        self.assertQueryBudget(0, "get", "/api/farmotoria/ping/")
+
+    def test_register(self):
+        self.client.force_authenticate(None)
+        # Пользователь, профиль и поле: по одной вставке на таблицу
+        self.assertQueryBudget(6, "post", "/api/auth/register/", {
+            "username": "newbie", "email": "n@example.com", "password": "secret123",
+        })
+
+    @override_settings(STARTING_COINS=50, STARTING_INVENTORY={"seed-0": 3, "unknown": 1})
+    def test_register_provisions_player(self):
+        self.client.force_authenticate(None)
+        self.client.post("/api/auth/register/", {
+            "username": "newbie", "email": "n@example.com", "password": "secret123",
+        }, format="json")
+
+        profile = PlayerProfile.objects.get(user__username="newbie")
+        self.assertEqual((profile.coins_balance, ledger_balance(profile.id)), (50, 50))
+        self.assertEqual(
+            list(InventoryItem.objects.filter(player=profile).values_list("item_id", "quantity")),
+            [(self.seeds[0].id, 3)],
+        )
+        self.assertEqual(Cell.objects.filter(owner=profile.user).count(), 2 * ROWS)
+
+        # За пределами стартового поля клетка создаётся при первом действии
+        self.client.force_authenticate(profile.user)
+        response = self.client.post(
+            "/api/field/cells/action/", {"row": 5, "col": 0, "plant_id": self.seeds[0].id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Cell.objects.get(owner=profile.user, row=5, col=0).shop_item_id, self.seeds[0].id)
+
+        # ...но не дальше FIELD_MAX_ROWS x FIELD_MAX_COLS
+        with override_settings(FIELD_MAX_ROWS=5):
+            response = self.client.post("/api/field/cells/action/", {"row": 5, "col": 0}, format="json")
+        self.assertEqual((response.status_code, response.json()["detail"]), (400, "Клетка вне поля"))
+
+    def test_token(self):
+        self.client.force_authenticate(None)
+        self.assertQueryBudget(1, "post", "/api/auth/token/", {
+            "username": "farmer", "password": "secret123",
+        })
+
+    def test_token_refresh(self):
+        self.client.force_authenticate(None)
+        refresh = self.client.post(
+            "/api/auth/token/", {"username": "farmer", "password": "secret123"}, format="json"
+        ).json()["refresh"]
+        # Единственный запрос — проверка simplejwt, что пользователь ещё активен
+        response = self.assertQueryBudget(1, "post", "/api/auth/token/refresh/", {"refresh": refresh})
+        self.assertIn("access", response.json())
+
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        response = self.client.post("/api/auth/token/refresh/", {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_grow_fields(self):
+        with override_settings(FIELD_ROWS=3):
+            call_command("grow_fields", stdout=StringIO())
+            self.assertEqual(Cell.objects.filter(owner=self.user).count(), 3 * ROWS)
+            # Повторный запуск ничего не добавляет
+            out = StringIO()
+            call_command("grow_fields", stdout=out)
+            self.assertEqual(out.getvalue().strip(), "Поля всех игроков полные")
+            response = self.client.post("/api/field/cells/action/", {"row": 2, "col": 0}, format="json")
+            self.assertEqual(response.status_code, 400)  # клетка есть, но пустая
+
+    def test_cached_jwt_principal(self):
+        clear_principals()
+        self.fill_inventory()
+        self.client.force_authenticate(None)
+        access = self.client.post(
+            "/api/auth/token/", {"username": "farmer", "password": "secret123"}, format="json"
+        ).json()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        # Первый запрос загружает пользователя и id профиля, дальше — только инвентарь
+        self.assertQueryBudget(3, "get", "/api/inventory/")
+        self.assertQueryBudget(1, "get", "/api/inventory/")
+        self.assertQueryBudget(1, "get", "/api/me/coins/history/")
+
+        # Сохранение пользователя сбрасывает принципал
+        self.user.save()
+        self.assertQueryBudget(3, "get", "/api/inventory/")
+
+    def test_me(self):
+        self.assertQueryBudget(3, "get", "/api/me/")
+
+    def test_refresh_skill_modifiers_after_new_skill(self):
+        # Каталог воркера и метка в общем кэше переживают откат транзакции теста
+        self.addCleanup(invalidate_catalog)
+        self.addCleanup(caches[settings.CATALOG_CACHE].delete, MODIFIERS_VERSION_KEY)
+        User.objects.create_user("neighbour", password="secret123")
+        Skill.objects.create(code="fishing", name="Рыбалка", effect_name="Улов", effect_value_per_level=2)
+
+        out = StringIO()
+        call_command("refresh_skill_modifiers", batch_size=1, stdout=out)
+        self.assertIn("2/2", out.getvalue())
+        version = get_catalog().skills_version
+        self.assertEqual(
+            set(PlayerProfile.objects.values_list("skills_version", flat=True)), {version}
+        )
+        self.profile.refresh_from_db()
+        self.assertEqual(sorted(self.profile.skill_modifiers), ["farming", "fishing"])
+
+        # Запрос игрока больше не пересчитывает модификаторы сам
+        self.assertQueryBudget(3, "get", "/api/me/")
+
+        # Пока навыки не менялись, повторный запуск не сканирует профили
+        with self.assertNumQueries(0):
+            call_command("refresh_skill_modifiers", stdout=StringIO())
+
+    def test_skills_are_sparse(self):
+        self.assertFalse(UserSkill.objects.filter(user=self.user).exists())
+        skills = self.client.get("/api/me/").json()["skills"]
+        self.assertEqual([(s["name"], s["level"], s["id"]) for s in skills], [("Земледелие", 0, None)])
+
+        # Строка появляется, когда навык получил опыт
+        self.fill_field()
+        self.client.post("/api/field/cells/action/", {"row": 0, "col": 0}, format="json")
+        flush_exp(self.user)
+        self.assertEqual(UserSkill.objects.get(user=self.user).exp, 1)
+
+    # ===== Поле =====
+
+    def test_cell_list(self):
+        self.fill_field()
+        response = self.assertQueryBudget(1, "get", "/api/field/cells/")
+        self.assertEqual(len(response.json()), 2 * ROWS)
+
+    def test_cell_list_since(self):
+        self.fill_field()
+        self.assertQueryBudget(1, "get", "/api/field/cells/?since=2000-01-01T00:00:00Z")
+
+    def test_cell_list_since_returns_changed_cells(self):
+        Cell.objects.filter(owner=self.user).update(updated_at=timezone.now() - timedelta(hours=1))
+        full = self.client.get("/api/field/cells/?since=").json()
+        self.assertEqual(len(full["cells"]), 2 * ROWS)
+
+        cursor = full["cursor"]
+        self.assertEqual(self.client.get("/api/field/cells/", {"since": cursor}).json()["cells"], [])
+
+        InventoryItem.objects.create(player=self.profile, item=self.seeds[0], quantity=1)
+        self.client.post("/api/field/cells/action/", {"row": 1, "col": 1, "plant_id": self.seeds[0].id}, format="json")
+        changed = self.client.get("/api/field/cells/", {"since": cursor}).json()
+        self.assertEqual([(cell["row"], cell["col"]) for cell in changed["cells"]], [(1, 1)])
+        self.assertEqual(self.client.get("/api/field/cells/?since=nonsense").status_code, 400)
+
+    def test_field_grid(self):
+        self.fill_field()
+        self.assertQueryBudget(1, "get", "/api/field/grid/")
+
+    def test_field_grid_arrays(self):
+        self.fill_field()
+        Cell.objects.filter(owner=self.user, row=0, col__gt=0).update(shop_item=None, ready_at=None)
+        grid = self.client.get("/api/field/grid/").json()
+
+        self.assertEqual(grid["rows"], [0] * ROWS + [1] * ROWS)
+        self.assertEqual(grid["cols"], list(range(ROWS)) * 2)
+        self.assertEqual(grid["items"], [self.seeds[0].id] + [None] * (2 * ROWS - 1))
+        ready_at = Cell.objects.get(owner=self.user, row=0, col=0).ready_at
+        self.assertEqual(grid["ready_at"][:2], [int(ready_at.timestamp()), None])
+        # В словаре только задействованное семя и его урожай
+        self.assertEqual(sorted(grid["catalog"]), sorted([str(self.seeds[0].id), str(self.harvest[0].id)]))
+        self.assertEqual(grid["catalog"][str(self.seeds[0].id)]["harvest_item"], self.harvest[0].id)
+
+    def test_next_ready(self):
+        self.fill_field(ready=False)
+        self.assertQueryBudget(1, "get", "/api/field/next-ready/")
+
+    def test_ready_filters(self):
+        self.fill_field()
+        soon = timezone.now() + timedelta(minutes=5)
+        Cell.objects.filter(owner=self.user, row=0, col__in=[1, 2]).update(ready_at=soon + timedelta(minutes=1))
+        Cell.objects.filter(owner=self.user, row=0, col=3).update(ready_at=soon)
+
+        ready = self.client.get("/api/field/cells/?ready=true").json()
+        self.assertEqual([cell["col"] for cell in ready], [0, 4, 5])
+        growing = self.client.get("/api/field/cells/?ready=false").json()
+        # Ближайшие к созреванию — первыми
+        self.assertEqual([cell["col"] for cell in growing], [3, 1, 2])
+
+        next_ready = self.client.get("/api/field/next-ready/").json()
+        self.assertEqual(next_ready["next_ready_at"], soon.isoformat())
+        self.assertTrue(0 < next_ready["seconds_until_ready"] <= 300)
+
+    def test_plant_sets_ready_at(self):
+        InventoryItem.objects.create(player=self.profile, item=self.seeds[0], quantity=1)
+        self.client.post("/api/field/cells/action/", {"row": 1, "col": 1, "plant_id": self.seeds[0].id}, format="json")
+        cell = Cell.objects.get(owner=self.user, row=1, col=1)
+        self.assertEqual(cell.ready_at, cell.planted_at + timedelta(seconds=cell.grow_duration_seconds))
+
+    def test_cell_action_plant(self):
+        self.fill_inventory()
+        self.assertQueryBudget(10, "post", "/api/field/cells/action/", {
+            "row": 1, "col": 1, "plant_id": self.seeds[0].id,
+        })
+
+    def test_cell_action_harvest(self):
+        self.fill_field()
+        self.fill_inventory()
+        self.assertQueryBudget(8, "post", "/api/field/cells/action/", {"row": 0, "col": 0})
+
+    def test_cell_action_harvest_race(self):
+        self.fill_field()
+
+        def harvested_concurrently(cells):
+            # Другой запрос успел собрать клетку между чтением и записью
+            attach_items(cells)
+            Cell.objects.filter(id__in=[cell.id for cell in cells]).update(shop_item=None, ready_at=None)
+
+        with mock.patch("game.views.attach_items", side_effect=harvested_concurrently):
+            response = self.client.post("/api/field/cells/action/", {"row": 0, "col": 0}, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(InventoryItem.objects.filter(player=self.profile).exists())
+        self.assertFalse(ExpDelta.objects.exists())
+
+    def test_skill_level_up_refreshes_growth_modifier(self):
+        self.fill_field()
+        UserSkill.objects.create(
+            user=self.user, skill=Skill.objects.get(code="farming"), level=2, exp=int(50 * 1.3 ** 2) - 1
+        )
+        self.client.post("/api/field/cells/action/", {"row": 0, "col": 0}, format="json")
+        flush_exp(self.user)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.skill_modifiers["farming"], {"level": 3, "per_level": 5, "value": 15})
+
+        InventoryItem.objects.create(player=self.profile, item=self.seeds[0], quantity=1)
+        response = self.client.post(
+            "/api/field/cells/action/", {"row": 0, "col": 0, "plant_id": self.seeds[0].id}, format="json"
+        )
+        self.assertEqual(response.json()["growth_bonus"]["percent_reduction"], 15)
+
+    def test_harvest_exp_is_buffered(self):
+        self.fill_field()
+        response = self.client.post("/api/field/cells/action/", {"row": 0, "col": 0}, format="json")
+        self.assertEqual(response.json()["profile"]["exp"], 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.exp, 0)
+
+        # /api/me/ показывает сохранённый опыт вместе с буфером
+        me = self.client.get("/api/me/").json()
+        self.assertEqual((me["exp"], me["skills"][0]["exp"]), (1, 1))
+
+        call_command("flush_exp", older_than=0, stdout=StringIO())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.exp, 1)
+        self.assertEqual(UserSkill.objects.get(user=self.user).exp, 1)
+        self.assertFalse(ExpDelta.objects.exists())
+
+    @override_settings(EXP_FLUSH_MAX_PENDING=2)
+    def test_harvest_exp_flushes_after_commit(self):
+        self.fill_field()
+        for col in range(2):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post("/api/field/cells/action/", {"row": 0, "col": col}, format="json")
+            # Одна строка на цель: начисления складываются
+            self.assertEqual(ExpDelta.objects.filter(user=self.user).count(), 0 if callbacks else 2)
+        self.assertEqual(len(callbacks), 1)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.exp, 2)
+        self.assertEqual(UserSkill.objects.get(user=self.user).exp, 2)
+
+    def test_cell_batch_action(self):
+        self.fill_field()
+        self.fill_inventory()
+        actions = [{"row": 0, "col": i} for i in range(ROWS)]
+        actions += [{"row": 1, "col": i, "plant_id": seed.id} for i, seed in enumerate(self.seeds)]
+        self.assertQueryBudget(13, "post", "/api/field/cells/action/batch/", {"actions": actions})
+
+    def test_cell_batch_action_results(self):
+        self.fill_field()
+        InventoryItem.objects.create(player=self.profile, item=self.seeds[1], quantity=1)
+        response = self.client.post("/api/field/cells/action/batch/", {"actions": [
+            {"row": 0, "col": 0},
+            {"row": 1, "col": 0},
+            {"row": 1, "col": 1, "plant_id": self.seeds[1].id},
+            {"row": 1, "col": 2, "plant_id": 999999},
+            {"row": 5, "col": 5, "plant_id": self.seeds[0].id, "auto_buy": True},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(r["index"], r["ok"], r.get("action"), r.get("detail")) for r in results],
+            [
+                (0, True, "harvest", None),
+                (1, False, None, "Растение не созрело"),
+                (2, True, "plant", None),
+                (3, False, None, "Семя не найдено"),
+                (4, True, "plant", None),
+            ],
+        )
+        # Клетка за пределами стартового поля создана первым действием
+        self.assertEqual(Cell.objects.get(owner=self.user, row=5, col=5).shop_item_id, self.seeds[0].id)
+        inventory = dict(InventoryItem.objects.filter(player=self.profile).values_list("item_id", "quantity"))
+        self.assertEqual(inventory, {self.harvest[0].id: 2, self.seeds[1].id: 0})
+        self.assertEqual(response.json()["profile"]["exp"], 1)
+        planted = Cell.objects.get(owner=self.user, row=1, col=1)
+        self.assertEqual((planted.shop_item_id, planted.ready_at is not None), (self.seeds[1].id, True))
+
+    def test_cell_batch_auto_buy(self):
+        PlayerProfile.objects.filter(id=self.profile.id).update(coins_balance=5)
+        response = self.client.post("/api/field/cells/action/batch/", {"actions": [
+            {"row": 1, "col": 0, "plant_id": self.seeds[0].id, "auto_buy": True},
+            {"row": 1, "col": 1, "plant_id": self.seeds[0].id, "auto_buy": True},
+            {"row": 1, "col": 2, "plant_id": self.seeds[0].id},
+        ]}, format="json")
+        self.assertEqual([r["ok"] for r in response.json()["results"]], [True, False, False])
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.coins_balance, 2)
+        self.assertEqual(
+            list(CoinLedgerEntry.objects.filter(player=self.profile).values_list("amount", "reason")),
+            [(-3, "auto_buy")],
+        )
+
+    def test_cell_batch_conflict_rolls_back(self):
+        self.fill_field()
+        PlayerProfile.objects.filter(id=self.profile.id).update(coins_balance=5)
+        with mock.patch("game.views.apply_inventory_deltas", return_value=False):
+            response = self.client.post("/api/field/cells/action/batch/", {"actions": [
+                {"row": 0, "col": 0},
+                {"row": 1, "col": 0, "plant_id": self.seeds[0].id, "auto_buy": True},
+            ]}, format="json")
+        self.assertEqual(response.status_code, 409)
+
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.coins_balance, self.profile.exp), (5, 0))
+        self.assertFalse(CoinLedgerEntry.objects.exists())
+        self.assertEqual(Cell.objects.get(owner=self.user, row=0, col=0).shop_item_id, self.seeds[0].id)
+        self.assertIsNone(Cell.objects.get(owner=self.user, row=1, col=0).shop_item_id)
+
+    def test_harvest_all(self):
+        self.fill_field()
+        self.fill_inventory()
+        # Весь урожай — одним upsert, число запросов не зависит от числа клеток
+        self.assertQueryBudget(10, "post", "/api/field/cells/harvest-all/")
+
+    def test_harvest_all_totals(self):
+        self.fill_field()
+        # Две клетки одного семени — урожай суммируется в одну строку
+        Cell.objects.filter(owner=self.user, row=0, col=1).update(shop_item=self.seeds[0])
+        Cell.objects.filter(owner=self.user, row=0, col=2).update(ready_at=timezone.now() + timedelta(hours=1))
+
+        response = self.client.post("/api/field/cells/harvest-all/")
+        data = response.json()
+        self.assertEqual((data["harvested_cells"], data["exp_gained"]), (ROWS - 1, ROWS - 1))
+        self.assertEqual(data["harvest_added"][0], {
+            "item_id": self.harvest[0].id, "item": "Урожай 0", "quantity": 4, "cells": 2,
+        })
+        self.assertEqual(data["profile"]["exp"], ROWS - 1)
+
+        inventory = dict(InventoryItem.objects.filter(player=self.profile).values_list("item_id", "quantity"))
+        self.assertEqual(inventory, {
+            self.harvest[0].id: 4, self.harvest[3].id: 2, self.harvest[4].id: 2, self.harvest[5].id: 2,
+        })
+        self.assertEqual(UserSkill.objects.get(user=self.user).exp, ROWS - 1)
+        # Незрелая клетка осталась на месте
+        self.assertEqual(
+            list(Cell.objects.filter(owner=self.user, shop_item__isnull=False).values_list("col", flat=True)),
+            [2],
+        )
+
+    def test_harvest_all_conflict_rolls_back(self):
+        self.fill_field()
+        # Клетки изменились между подсчётом и сбросом
+        with mock.patch("django.db.models.query.QuerySet.update", return_value=0):
+            response = self.client.post("/api/field/cells/harvest-all/")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(InventoryItem.objects.filter(player=self.profile).exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.exp, 0)
+
+    def test_plants(self):
+        self.assertQueryBudget(0, "get", "/api/plants/")
+
+    # ===== Инвентарь, магазин, рынок =====
+
+    def test_inventory(self):
+        self.fill_inventory()
+        self.assertQueryBudget(2, "get", "/api/inventory/")
+
+    def test_shop_seeds(self):
+        self.assertQueryBudget(0, "get", "/api/shop/seeds/")
+
+    def test_shop_harvest(self):
+        self.assertQueryBudget(0, "get", "/api/shop/harvest/")
+
+    def test_shop_not_modified(self):
+        etag = self.client.get("/api/shop/seeds/")["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/shop/seeds/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(len(ctx), 0)
+
+    def test_shop_category(self):
+        self.assertQueryBudget(0, "get", "/api/shop/Seeds/")
+
+    def test_shop_buy(self):
+        self.assertQueryBudget(7, "post", "/api/shop/buy/", {"item_id": self.seeds[0].id})
+
+    def test_shop_checkout(self):
+        items = [{"item_id": seed.id, "quantity": 2} for seed in self.seeds]
+        self.assertQueryBudget(7, "post", "/api/shop/checkout/", {"items": items})
+        self.assertEqual(
+            InventoryItem.objects.filter(player=self.profile, item__in=self.seeds, quantity=2).count(),
+            ROWS
+        )
+
+    def test_shop_checkout_insufficient_coins(self):
+        items = [{"item_id": seed.id, "quantity": 100} for seed in self.seeds]
+        response = self.client.post("/api/shop/checkout/", {"items": items}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(InventoryItem.objects.filter(player=self.profile).exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.coins_balance, 1000)
+
+    def test_market_inventory(self):
+        self.fill_inventory()
+        self.assertQueryBudget(2, "get", "/api/market/inventory/")
+
+    def test_market_sell(self):
+        self.fill_inventory()
+        inv = InventoryItem.objects.get(player=self.profile, item=self.harvest[0])
+        self.assertQueryBudget(8, "post", "/api/market/sell/", {"item_id": inv.id, "quantity": 1})
+
+    def test_market_sell_bulk(self):
+        self.fill_inventory()
+        rows = InventoryItem.objects.filter(player=self.profile, item__in=self.harvest)
+        items = [{"item_id": inv.id, "quantity": 3} for inv in rows]
+        self.assertQueryBudget(8, "post", "/api/market/sell/bulk/", {"items": items})
+        self.assertQueryBudget(8, "post", "/api/market/sell/bulk/", {"sell_all_harvest": True})
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.coins_balance, 1000 + ROWS * 10 * 5)
+
+    def test_market_sell_bulk_partial(self):
+        inv = InventoryItem.objects.create(player=self.profile, item=self.harvest[0], quantity=2)
+        response = self.client.post("/api/market/sell/bulk/", {"items": [
+            {"item_id": inv.id, "quantity": 2},
+            {"item_id": inv.id, "quantity": 1},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line["ok"] for line in response.json()["results"]], [True, False])
+        self.assertEqual(response.json()["coins_balance"], 1000 + 2 * 5)
+
+    def test_coin_history(self):
+        CoinLedgerEntry.objects.bulk_create([
+            CoinLedgerEntry(player=self.profile, amount=i, reason="sell") for i in range(1, ROWS + 1)
+        ])
+        # id профиля + записи (с JWT-принципалом id профиля уже известен)
+        self.assertQueryBudget(2, "get", "/api/me/coins/history/")
+
+    @override_settings(THROTTLE_LOCAL_MAX_KEYS=2)
+    def test_local_buckets_evict_least_recently_used(self):
+        backend = LocalBucketBackend()
+        for key in ("a", "b", "a", "c"):
+            backend.take(key, 0.001, 1)
+        # Выброшено «b»: «a» использовалось позже и осталось пустым
+        self.assertEqual(list(backend._buckets), ["a", "c"])
+        self.assertGreater(backend.take("a", 0.001, 1), 0)
+
+    @override_settings(THROTTLE_BACKEND="cache")
+    def test_cache_buckets_keep_catalog_version(self):
+        version = caches[settings.CATALOG_CACHE].get(VERSION_KEY)
+        self.assertIsNotNone(version)
+        for user_id in range(10):
+            get_backend().take(f"throttle:buy:{user_id}", 1, 1)
+        get_backend().clear()
+        self.assertEqual(caches[settings.CATALOG_CACHE].get(VERSION_KEY), version)
+
+    def test_buy_throttled_after_burst(self):
+        self.profile.coins_balance = 100
+        self.profile.save()
+        for backend in ("local", "cache"):
+            with self.settings(THROTTLE_RATES={"buy": (0.5, 2)}, THROTTLE_BACKEND=backend):
+                get_backend().clear()
+                statuses = [
+                    self.client.post("/api/shop/buy/", {"item_id": self.seeds[0].id}, format="json").status_code
+                    for _ in range(3)
+                ]
+                self.assertEqual(statuses, [200, 200, 429], backend)
+                # Следующий токен — через 1 / rate секунд
+                response = self.client.post("/api/shop/buy/", {"item_id": self.seeds[0].id}, format="json")
+                self.assertEqual(response["Retry-After"], "2")
+
+    # ===== Рейтинги =====
+
+    def test_leaderboard(self):
+        for i in range(ROWS):
+            rival = User.objects.create_user(f"rival{i}", password="secret123")
+            PlayerProfile.objects.filter(user=rival).update(level=i + 2)
+        call_command("refresh_leaderboards", stdout=StringIO())
+
+        response = self.assertQueryBudget(1, "get", "/api/leaderboard/level/?limit=3")
+        self.assertEqual([e["username"] for e in response.json()["entries"]], ["rival5", "rival4", "rival3"])
+        response = self.assertQueryBudget(3, "get", "/api/leaderboard/level/me/?around=1")
+        self.assertEqual(response.json()["rank"], ROWS + 1)
+        self.assertEqual([e["username"] for e in response.json()["entries"]], ["rival0", "farmer"])
+
+        # Недельный рейтинг считает прирост с первого пересчёта недели
+        PlayerProfile.objects.filter(id=self.profile.id).update(harvest_count=3)
+        call_command("refresh_leaderboards", stdout=StringIO())
+        me = self.client.get("/api/leaderboard/harvest/me/?period=week&around=1").json()
+        self.assertEqual((me["rank"], me["entries"][0]["score"]), (1, 3))
+
+        self.assertEqual(self.client.get("/api/leaderboard/nope/").status_code, 404)
+
+    def test_leaderboard_refresh_overlap(self):
+        call_command("refresh_leaderboards", stdout=StringIO())
+        # Наложившийся пересчёт не видел строк, созданных первым
+        with mock.patch("game.leaderboard._existing_entries", return_value={}):
+            PlayerProfile.objects.filter(id=self.profile.id).update(coins_balance=7)
+            call_command("refresh_leaderboards", stdout=StringIO())
+        entries = LeaderboardEntry.objects.filter(board="coins", period="all", player=self.profile)
+        self.assertEqual(list(entries.values_list("score", "rank")), [(7, 1)])
+
+    @skipUnless(connection.vendor == "postgresql", "advisory lock есть только в PostgreSQL")
+    def test_leaderboard_refresh_is_serialized(self):
+        other = connection.copy()
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [REFRESH_LOCK_ID])
+        out = StringIO()
+        call_command("refresh_leaderboards", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Пересчёт рейтингов уже идёт, пропускаем")
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_leaderboard_counts_buffered_harvests(self):
+        self.fill_field()
+        self.client.post("/api/field/cells/action/", {"row": 0, "col": 0}, format="json")
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.exp, self.profile.harvest_count), (0, 0))
+
+        # Буфер ещё не применён, но рейтинг его уже учитывает
+        call_command("refresh_leaderboards", stdout=StringIO())
+        harvest = self.client.get("/api/leaderboard/harvest/me/").json()
+        level = self.client.get("/api/leaderboard/level/me/").json()
+        self.assertEqual((harvest["entries"][0]["score"], level["entries"][0]["score"]), (1, 1))
+
+        flush_exp(self.user)
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.exp, self.profile.harvest_count), (1, 1))
+
+    def test_coin_history_pages_ties(self):
+        at = timezone.now()
+        CoinLedgerEntry.objects.bulk_create([
+            CoinLedgerEntry(player=self.profile, amount=i, reason="sell", created_at=at) for i in range(1, 6)
+        ])
+        amounts, params = [], {}
+        with mock.patch("game.views.COIN_HISTORY_PAGE_SIZE", 2):
+            while True:
+                page = self.client.get("/api/me/coins/history/", params).json()
+                amounts += [entry["amount"] for entry in page["entries"]]
+                if page["next_before"] is None:
+                    break
+                params = {"before": page["next_before"], "before_id": page["next_before_id"]}
+        self.assertEqual(amounts, [5, 4, 3, 2, 1])
+
+    def test_market_sell_rejects_bad_input(self):
+        inv = InventoryItem.objects.create(player=self.profile, item=self.harvest[0], quantity=2)
+        for data in ({"item_id": "abc", "quantity": 1}, {"quantity": 1}, {"item_id": inv.id, "quantity": 0}):
+            response = self.client.post("/api/market/sell/", data, format="json")
+            self.assertEqual(response.status_code, 400, data)
+        inv.refresh_from_db()
+        self.assertEqual(inv.quantity, 2)
+
+    def test_market_sell_more_than_owned(self):
+        inv = InventoryItem.objects.create(player=self.profile, item=self.harvest[0], quantity=2)
+        response = self.client.post("/api/market/sell/", {"item_id": inv.id, "quantity": 3}, format="json")
+        self.assertEqual(response.status_code, 400)
+        inv.refresh_from_db()
+        self.assertEqual(inv.quantity, 2)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.coins_balance, 1000)
+
+    def test_shop_buy_upserts_single_row(self):
+        for _ in range(2):
+            self.client.post("/api/shop/buy/", {"item_id": self.seeds[0].id, "quantity": 2}, format="json")
+        rows = InventoryItem.objects.filter(player=self.profile, item=self.seeds[0])
+        self.assertEqual(list(rows.values_list("quantity", flat=True)), [4])
+
+    def test_empty_inventory_rows_are_kept(self):
+        inv = InventoryItem.objects.create(player=self.profile, item=self.harvest[0], quantity=1)
+        self.client.post("/api/market/sell/", {"item_id": inv.id, "quantity": 1}, format="json")
+        inv.refresh_from_db()
+        self.assertEqual(inv.quantity, 0)
+        self.assertEqual(self.client.get("/api/market/inventory/").json(), [])
+
+        InventoryItem.objects.filter(id=inv.id).update(updated_at=timezone.now() - timedelta(days=60))
+        call_command("compact_inventory", days=30, stdout=StringIO())
+        self.assertFalse(InventoryItem.objects.filter(id=inv.id).exists())
+
+    def test_coin_ledger_compaction_keeps_balance(self):
+        self.client.post("/api/shop/buy/", {"item_id": self.seeds[0].id, "quantity": 2}, format="json")
+        inv = InventoryItem.objects.get(player=self.profile, item=self.seeds[0])
+        self.client.post("/api/market/sell/", {"item_id": inv.id, "quantity": 1}, format="json")
+
+        history = self.client.get("/api/me/coins/history/").json()["entries"]
+        self.assertEqual([(e["amount"], e["reason"]) for e in history], [(3, "sell"), (-6, "buy")])
+
+        # Начальный баланс фикстуры — как снимок из миграции 0030
+        CoinBalanceSnapshot.objects.create(
+            player=self.profile, balance=1000, taken_at=timezone.now() - timedelta(days=365)
+        )
+        CoinLedgerEntry.objects.update(created_at=timezone.now() - timedelta(days=100))
+        call_command("compact_coin_ledger", days=90, stdout=StringIO())
+
+        self.assertFalse(CoinLedgerEntry.objects.exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.coins_balance, 997)
+        self.assertEqual(ledger_balance(self.profile.id), 997)
+
+
+class ProgressionTests(SimpleTestCase):
+    """
+    Табличный расчёт уровней совпадает с пошаговым начислением опыта
+    """
+
+    def test_profile_large_grant_matches_stepwise(self):
+        bulk = SimpleNamespace(level=3, exp=120)
+        step = SimpleNamespace(level=3, exp=120)
+        add_profile_exp(bulk, 12345)
+        for _ in range(12345):
+            add_profile_exp(step, 1)
+        self.assertEqual((bulk.level, bulk.exp), (step.level, step.exp))
+        self.assertEqual((bulk.level, bulk.exp), (16, 765))
+
+    def test_skill_levels_and_max_level(self):
+        skill = Skill(max_level=10, base_exp=50, exp_growth=1.3)
+        user_skill = UserSkill(skill=skill, level=0, exp=0)
+        add_skill_exp(user_skill, 50 + 65 + 10)
+        self.assertEqual((user_skill.level, user_skill.exp), (2, 10))
+        self.assertEqual(user_skill.exp_to_next, int(50 * 1.3 ** 2))
+
+        add_skill_exp(user_skill, 10 ** 9)
+        self.assertEqual((user_skill.level, user_skill.exp), (10, 0))
+        self.assertEqual(user_skill.exp_to_next, 0)
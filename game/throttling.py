@@ -0,0 +1,130 @@
+"""
+Ограничение частоты действий игрока: token bucket на пару (игрок, scope).
+
+Ведро вмещает burst токенов и пополняется rate токенов в секунду; запрос
+тратит один токен. Пачка быстрых действий проходит за счёт burst, дальше —
+не чаще rate в секунду. Лимиты — THROTTLE_RATES {scope: (rate, burst)}.
+Без токена — 429 с Retry-After (секунды до следующего токена).
+
+Где хранить вёдра, решает THROTTLE_BACKEND:
+- "local" — память процесса: без запросов, но лимит на каждый воркер;
+- "cache" — кэш THROTTLE_CACHE, общий для узлов. get/set не атомарны:
+  при гонке параллельных запросов лимит может быть чуть превышен.
+  Кэш — свой, не CATALOG_CACHE: вытеснение вёдер и clear() не должны
+  сбрасывать метку версии каталога.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: int) -> float:
+    return min(float(burst), tokens + max(now - updated_at, 0.0) * rate)
+
+
+def spend(tokens: float, rate: float) -> tuple:
+    """
+    (остаток, ожидание): ожидание 0 — токен списан
+    """
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBucketBackend:
+    """
+    Вёдра в памяти процесса, не больше THROTTLE_LOCAL_MAX_KEYS: сверх лимита
+    выбрасывается ведро, к которому дольше всех не обращались (LRU, O(1)).
+    Оно почти наверняка уже полное, а полное ведро ничем не отличается
+    от отсутствующего.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # {key: (tokens, updated_at)}, от давних к свежим
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (burst, now))
+            tokens, wait = spend(refill(tokens, updated_at, now, rate, burst), rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > settings.THROTTLE_LOCAL_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketBackend:
+    """
+    Вёдра в общем кэше THROTTLE_CACHE
+    """
+    def take(self, key: str, rate: float, burst: int) -> float:
+        cache = caches[settings.THROTTLE_CACHE]
+        now = time.time()
+        tokens, updated_at = cache.get(key, (burst, now))
+        tokens, wait = spend(refill(tokens, updated_at, now, rate, burst), rate)
+        # Когда ведро снова полное, запись не нужна
+        cache.set(key, (tokens, now), timeout=int((burst - tokens) / rate) + 1)
+        return wait
+
+    def clear(self) -> None:
+        caches[settings.THROTTLE_CACHE].clear()
+
+
+BACKENDS = {
+    "local": LocalBucketBackend(),
+    "cache": CacheBucketBackend(),
+}
+
+
+def get_backend():
+    return BACKENDS[settings.THROTTLE_BACKEND]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый класс: наследники задают scope (ключ THROTTLE_RATES)
+    """
+    scope = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        limit = settings.THROTTLE_RATES.get(self.scope)
+        if limit is None:
+            return True
+        rate, burst = limit
+
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        self.wait_seconds = get_backend().take(f"throttle:{self.scope}:{ident}", rate, burst)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CellActionThrottle(TokenBucketThrottle):
+    scope = "cell_action"
+
+
+class CellBatchThrottle(TokenBucketThrottle):
+    scope = "cell_batch"
+
+
+class BuyThrottle(TokenBucketThrottle):
+    scope = "buy"
+
+
+class SellThrottle(TokenBucketThrottle):
+    scope = "sell"
@@ -1,22 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone
-from django.db.models import Sum, Value, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.db.models import Count, F, Sum, Value, Q
 from django.db.models.functions import Coalesce
 
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 
+from .authentication import get_profile_id
+from .catalog import attach_items, get_catalog
+from .experience import apply_exp, flush_exp, harvest_exp, pending_exp
+from .leaderboard import PERIOD_ALL, entries_around, resolve_period, top_entries
+from .economy import (
+    Reason, add_inventory, apply_inventory_deltas, coins_balance, credit_coins,
+    debit_coins, parse_quantity, take_inventory, take_inventory_rows,
+    upsert_inventory,
+)
 from .models import (
     PlayerProfile, Cell, InventoryItem, ShopItem, ItemCategory,
-    UserSkill, ensure_user_skills
+    CoinLedgerEntry, LeaderboardEntry, UserSkill, next_ready_at
 )
+from .progression import add_profile_exp
+from .provisioning import create_cells, field_contains
+from .skills import (
+    FARMING_SKILL_CODE, load_user_skills, refresh_modifiers, save_user_skills,
+    skill_effect, skill_modifiers,
+)
+from .throttling import BuyThrottle, CellActionThrottle, CellBatchThrottle, SellThrottle
 from .serializers import (
-    RegisterSerializer, PlayerProfileSerializer,
+    RegisterSerializer, PlayerProfileSerializer, CoinLedgerEntrySerializer,
     CellSerializer, InventoryItemSerializer, ShopItemSerializer, MarketItemSerializer
 )
 
@@ -36,8 +59,10 @@ class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile, _ = PlayerProfile.objects.get_or_create(user=request.user)
-        user_skills = ensure_user_skills(request.user)
+        profile = PlayerProfile.objects.get(user=request.user)
+        user_skills = load_user_skills(request.user, profile)
+        # Сохранённые значения + ещё не применённый буфер опыта (только в памяти)
+        apply_exp(request.user, profile, pending_exp(request.user), user_skills, save=False)
 
         return Response({
             "id": request.user.id,
@@ -48,7 +73,8 @@ class MeView(APIView):
             "exp": profile.exp,
             "skills": [
                 {
-                    "id": us.id,
+                    "id": us.id,  # None, пока навык не получил опыт
+                    "skill_id": us.skill_id,
                     "name": us.skill.name,
                     "level": us.level,
                     "exp": us.exp,
@@ -64,56 +90,254 @@ class MeView(APIView):
 # =========================
 # Shop Items (семена/урожай)
 # =========================
-class ShopItemListView(generics.ListAPIView):
-    queryset = ShopItem.objects.all().order_by("id")
-    serializer_class = ShopItemSerializer
-    permission_classes = [IsAuthenticated]
+class CatalogListView(APIView):
+    """
+    Список товаров каталога.
 
-class ShopSeedsListView(generics.ListAPIView):
-    queryset = ShopItem.objects.filter(is_seed=True).order_by("price_coins")
-    serializer_class = ShopItemSerializer
+    Тело ответа — готовые JSON-байты, которые рендерятся один раз
+    на версию каталога и хранятся в нём же (на воркер).
+    Условный GET: сильный ETag из версии каталога, на совпавший
+    If-None-Match отвечаем 304.
+    """
     permission_classes = [IsAuthenticated]
 
-class ShopHarvestListView(generics.ListAPIView):
-    queryset = ShopItem.objects.filter(is_harvest=True).order_by("price_coins")
-    serializer_class = ShopItemSerializer
-    permission_classes = [IsAuthenticated]
+    def get_cache_key(self):
+        return type(self).__name__
 
-class ShopByCategoryView(generics.ListAPIView):
-    serializer_class = ShopItemSerializer
-    permission_classes = [IsAuthenticated]
+    def get_items(self, catalog):
+        raise NotImplementedError
 
-    def get_queryset(self):
-        category_name = self.kwargs['category']
-        return ShopItem.objects.filter(
-            category__name=category_name
-        ).order_by('price_coins')
+    def render_items(self, catalog):
+        key = self.get_cache_key()
+        body = catalog.rendered.get(key)
+        if body is None:
+            items = self.get_items(catalog)
+            if items is None:
+                return b"[]"
+            body = JSONRenderer().render(ShopItemSerializer(items, many=True).data)
+            catalog.rendered[key] = body
+        return body
+
+    def get(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        etag = f'"{catalog.version}"'
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(self.render_items(catalog), content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = f"public, max-age={settings.CATALOG_HTTP_MAX_AGE}"
+        return response
+
+
+class ShopItemListView(CatalogListView):
+    def get_items(self, catalog):
+        return sorted(catalog.items.values(), key=lambda item: item.id)
+
+class ShopSeedsListView(CatalogListView):
+    def get_items(self, catalog):
+        return catalog.seeds
+
+class ShopHarvestListView(CatalogListView):
+    def get_items(self, catalog):
+        return catalog.harvests
+
+class ShopByCategoryView(CatalogListView):
+    def get_cache_key(self):
+        return ("category", self.kwargs["category"])
+
+    def get_items(self, catalog):
+        # Неизвестную категорию не кэшируем: ключи приходят от клиента
+        return catalog.by_category.get(self.kwargs["category"])
 
 # =========================
 # Клетки на ферме
 # =========================
+MIN_GROW_SECONDS = 30  # Минимум 30 сек
+HARVEST_EXP_GAIN = 1
+MAX_BATCH_ACTIONS = 100
+COIN_HISTORY_PAGE_SIZE = 50
+LEADERBOARD_TOP_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_AROUND = 5
+SYNC_CURSOR_OVERLAP = timedelta(seconds=5)
+
+
+def find_farming_skill(user_skills):
+    return next((us for us in user_skills if us.skill.code == FARMING_SKILL_CODE), None)
+
+
+def grow_duration_seconds(shop_item: ShopItem, reduction_percent: float) -> int:
+    base_seconds = shop_item.grow_time_minutes * 60
+    reduction_seconds = int(base_seconds * (reduction_percent / 100))
+    return max(base_seconds - reduction_seconds, MIN_GROW_SECONDS)
+
+
+def growth_bonus_data(growth: dict, shop_item: ShopItem, final_duration: int) -> dict:
+    """
+    growth — модификатор навыка "farming" из profile.skill_modifiers
+    """
+    return {
+        "skill_level": growth["level"],
+        "effect_value_per_level": growth["per_level"],
+        "percent_reduction": round(growth["value"], 1),
+        "original_minutes": shop_item.grow_time_minutes,
+        "final_minutes": round(final_duration / 60, 1)
+    }
+
+
+def profile_data(profile: PlayerProfile) -> dict:
+    return {
+        "exp": profile.exp,
+        "level": profile.level,
+        "coins_balance": profile.coins_balance
+    }
+
+
 class CellListView(ListAPIView):
+    """
+    Клетки игрока. ?ready=true — только созревшие, ?ready=false — ещё растущие
+    (фильтр и сортировка по ready_at в SQL).
+
+    ?since=<cursor> — инкрементальная синхронизация: только клетки,
+    изменённые после cursor, плюс новый cursor. Пустой since — полный список.
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = CellSerializer
 
+    def list(self, request, *args, **kwargs):
+        if "since" not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        since = request.query_params["since"]
+        cursor = timezone.now()
+        cells = self.get_queryset()
+
+        if since:
+            since_dt = parse_datetime(since)
+            if since_dt is None:
+                return Response({"detail": "Некорректный since"}, status=400)
+            if timezone.is_naive(since_dt):
+                since_dt = timezone.make_aware(since_dt)
+            # Перекрытие окна: транзакции, закоммиченные после нашего запроса
+            cells = cells.filter(updated_at__gt=since_dt - SYNC_CURSOR_OVERLAP)
+
+        return Response({
+            "cells": self.get_serializer(cells, many=True).data,
+            "cursor": cursor.isoformat().replace("+00:00", "Z"),
+            "full": not since,
+        })
+
     def get_queryset(self):
-        return Cell.objects.filter(owner=self.request.user)
+        # shop_item/harvest_item CellSerializer берёт из каталога в памяти
+        cells = Cell.objects.filter(owner=self.request.user)
+
+        ready = self.request.query_params.get("ready")
+        if ready is None:
+            return cells.order_by("row", "col")
+
+        now = timezone.now()
+        if ready.lower() in ("1", "true", "yes"):
+            cells = cells.filter(ready_at__lte=now)
+        else:
+            cells = cells.filter(ready_at__gt=now)
+        return cells.order_by("ready_at", "row", "col")
+
+
+class FieldGridView(APIView):
+    """
+    Компактное поле: параллельные массивы row/col/item/ready_at
+    и отдельный маленький словарь задействованных ShopItem.
+    Клиент сам разворачивает данные каталога.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        rows, cols, items, ready = [], [], [], []
+        for row, col, item_id, ready_at in (
+            Cell.objects
+            .filter(owner=request.user)
+            .order_by("row", "col")
+            .values_list("row", "col", "shop_item_id", "ready_at")
+        ):
+            rows.append(row)
+            cols.append(col)
+            items.append(item_id)
+            ready.append(int(ready_at.timestamp()) if ready_at else None)
+
+        shop = get_catalog()
+        catalog = {}
+        for item_id in {item_id for item_id in items if item_id is not None}:
+            item = shop.items.get(item_id)
+            if item is None:
+                continue
+            for entry in (item, shop.items.get(item.harvest_item_id)):
+                if entry is None or entry.id in catalog:
+                    continue
+                catalog[entry.id] = {
+                    "name": entry.name,
+                    "slug": entry.slug,
+                    "description": entry.description,
+                    "price_coins": entry.price_coins,
+                    "is_seed": entry.is_seed,
+                    "grow_time_minutes": entry.grow_time_minutes,
+                    "harvest_yield": entry.harvest_yield,
+                    "harvest_item": entry.harvest_item_id,
+                }
+
+        return Response({
+            "now": int(timezone.now().timestamp()),
+            "rows": rows,
+            "cols": cols,
+            "items": items,
+            "ready_at": ready,
+            "catalog": catalog,
+        })
+
+
+class NextReadyView(APIView):
+    """
+    Когда созреет ближайшая клетка — для пушей и интервала опроса клиента
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ready_at = next_ready_at(request.user)
+        seconds = None
+        if ready_at is not None:
+            seconds = max(int((ready_at - timezone.now()).total_seconds()), 0)
+        return Response({
+            "next_ready_at": ready_at.isoformat() if ready_at else None,
+            "seconds_until_ready": seconds,
+        })
     
 class CellActionView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [CellActionThrottle]
 
     @transaction.atomic
     def post(self, request):
-        row = request.data.get("row")
-        col = request.data.get("col")
+        try:
+            row = int(request.data.get("row"))
+            col = int(request.data.get("col"))
+        except (TypeError, ValueError):
+            return Response({"detail": "Некорректные row/col"}, status=400)
+        if not field_contains(row, col):
+            return Response({"detail": "Клетка вне поля"}, status=400)
         plant_id = request.data.get("plant_id")
         auto_buy = request.data.get("auto_buy", False)
 
-        profile, _ = PlayerProfile.objects.get_or_create(user=request.user)
-        cell, _ = Cell.objects.get_or_create(owner=request.user, row=row, col=col)
-        
-        # ✅ Инициализируем навыки ОДИН РАЗ в начале!
-        user_skills = ensure_user_skills(request.user)
+        # Профиль и стартовые клетки поля создаются при регистрации (provisioning.py)
+        profile = PlayerProfile.objects.get(user=request.user)
+        cell = Cell.objects.filter(owner=request.user, row=row, col=col).first()
+        if cell is None:
+            # За пределами стартового поля клетка создаётся при первом действии
+            create_cells(request.user, [(row, col)])
+            cell = Cell.objects.get(owner=request.user, row=row, col=col)
+        attach_items([cell])
 
         # 🌾 СБОР УРОЖАЯ (plant_id === null)
         if plant_id is None:
@@ -131,37 +355,30 @@ class CellActionView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Добавляем урожай
-            yield_qty = cell.shop_item.harvest_yield or 1
-            inv_item, _ = InventoryItem.objects.get_or_create(
-                player=profile, 
-                item=harvest_item
-            )
-            inv_item.quantity += yield_qty
-            inv_item.save()
+            # ✅ EXP: +1 к профилю И навыку "Земледелие" — через буфер опыта
+            # (туда же +1 к счётчику урожая).
+            # До сброса клетки: строки блокируются в том же порядке, что и
+            # в пакетных действиях (буфер опыта, затем клетки)
+            exp_gain = HARVEST_EXP_GAIN
+            profile = harvest_exp(request.user, profile, exp_gain, FARMING_SKILL_CODE)
 
-            # ✅ EXP: +1 к профилю И навыку "Земледелие"
-            exp_gain = 1
-            profile.exp += exp_gain
-            
-            # Навык "Земледелие" — используйте готовый метод!
-            farming_skill = next((us for us in user_skills if us.skill.name == "Земледелие"), None)
-            if farming_skill:
-                farming_skill.add_exp(exp_gain)  # ✅ Автоматически обновляет exp, level
-            
-            # Level up профиля
-            required_exp = profile.level * 100
-            if profile.exp >= required_exp:
-                profile.exp -= required_exp
-                profile.level += 1
-            
-            profile.save()
+            # Сброс клетки условным UPDATE: параллельный запрос мог уже собрать урожай
+            seed = cell.shop_item
+            planted = {"shop_item_id": seed.id, "ready_at": cell.ready_at}
+            cell.clear()
+            if not Cell.objects.filter(id=cell.id, **planted).update(
+                shop_item=None, planted_at=None, grow_duration_seconds=None, ready_at=None,
+                updated_at=cell.updated_at,
+            ):
+                transaction.set_rollback(True)
+                return Response(
+                    {"detail": "Клетка изменилась, повторите"},
+                    status=status.HTTP_409_CONFLICT
+                )
 
-            # Сброс клетки
-            cell.shop_item = None
-            cell.planted_at = None
-            cell.grow_duration_seconds = None
-            cell.save()
+            # Добавляем урожай
+            yield_qty = seed.harvest_yield or 1
+            add_inventory(profile.id, harvest_item.id, yield_qty)
 
             return Response({
                 "cell": CellSerializer(cell).data,
@@ -170,78 +387,351 @@ class CellActionView(APIView):
                     "quantity": yield_qty,
                     "exp_gained": exp_gain
                 },
-                "profile": {
-                    "exp": profile.exp,
-                    "level": profile.level,
-                    "coins_balance": profile.coins_balance
-                }
+                "profile": profile_data(profile)
             })
 
         # 🌱 ПОСАДКА СЕМЯН
-        try:
-            shop_item = ShopItem.objects.get(id=plant_id, is_seed=True)
-        except ShopItem.DoesNotExist:
+        shop_item = get_catalog().seed(plant_id)
+        if shop_item is None:
             return Response({"detail": "Семя не найдено"}, status=400)
 
-        # Семена из инвентаря
-        inv_item, _ = InventoryItem.objects.get_or_create(
-            player=profile, 
-            item=shop_item
-        )
+        # Семена из инвентаря: списываем 1 условным UPDATE
+        seeds_remaining = (
+            InventoryItem.objects
+            .filter(player=profile, item_id=shop_item.id)
+            .values_list("quantity", flat=True)
+            .first()
+        ) or 0
 
-        # Автопокупка если нет семян
-        if inv_item.quantity <= 0:
-            if not auto_buy or profile.coins_balance < shop_item.price_coins:
-                return Response({"detail": "Недостаточно семян или монет"}, status=400)
-            
-            # Покупаем 1 семя
-            profile.coins_balance -= shop_item.price_coins
-            inv_item.quantity += 1
-
-        # Списываем 1 семя
-        inv_item.quantity -= 1
-        if inv_item.quantity <= 0:
-            inv_item.delete()
+        if seeds_remaining > 0 and take_inventory(profile.id, shop_item.id, 1):
+            seeds_remaining -= 1
         else:
-            inv_item.save()
+            # Автопокупка если нет семян: купленное семя сразу сажаем
+            if not auto_buy or not debit_coins(profile.id, shop_item.price_coins, Reason.AUTO_BUY):
+                return Response({"detail": "Недостаточно семян или монет"}, status=400)
+            seeds_remaining = 0
 
-        # ✅ БОНУС ОТ НАВЫКА "Земледелие" (user_skills уже готова!)
-        growth_skill = next((us for us in user_skills if us.skill.name == "Земледелие"), None)
-        
-        time_reduction_percent = 0
-        if growth_skill:
-            # effect_value_per_level из модели Skill
-            time_reduction_percent = growth_skill.level * growth_skill.skill.effect_value_per_level
-            time_reduction_percent = min(time_reduction_percent, 75)  # Макс -75%
+        # ✅ БОНУС ОТ НАВЫКА "Земледелие": готовый модификатор из профиля
+        growth = skill_effect(skill_modifiers(request.user, profile), FARMING_SKILL_CODE)
 
         # Время роста с бонусом
-        base_seconds = shop_item.grow_time_minutes * 60
-        reduction_seconds = int(base_seconds * (time_reduction_percent / 100))
-        final_duration = max(base_seconds - reduction_seconds, 30)  # Минимум 30 сек
+        final_duration = grow_duration_seconds(shop_item, growth["value"])
 
         # Посадка с бонусом
-        cell.shop_item = shop_item
-        cell.planted_at = timezone.now()
-        cell.grow_duration_seconds = final_duration
+        cell.plant(shop_item, final_duration)
         cell.save()
 
         return Response({
             "cell": CellSerializer(cell).data,
-            "seeds_remaining": inv_item.quantity if hasattr(inv_item, 'quantity') else 0,
-            "growth_bonus": {
-                "skill_level": growth_skill.level if growth_skill else 0,
-                "effect_value_per_level": growth_skill.skill.effect_value_per_level if growth_skill else 0,
-                "percent_reduction": round(time_reduction_percent, 1),
-                "original_minutes": shop_item.grow_time_minutes,
-                "final_minutes": round(final_duration / 60, 1)
-            },
+            "seeds_remaining": seeds_remaining,
+            "growth_bonus": growth_bonus_data(growth, shop_item, final_duration),
             "message": f"✅ Посажено! ⏱️ {shop_item.grow_time_minutes} → {round(final_duration/60,1)} мин"
         })
+
+
+class CellBatchActionView(APIView):
+    """
+    Пакетная посадка/сбор урожая: список действий в одной транзакции.
+    Профиль, навыки, клетки и инвентарь загружаются один раз,
+    изменения записываются bulk-запросами.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [CellBatchThrottle]
+
+    @staticmethod
+    def parse_actions(actions):
+        parsed = []
+        for action in actions:
+            if not isinstance(action, dict):
+                raise ValueError("Каждое действие должно быть объектом")
+            try:
+                row = int(action.get("row"))
+                col = int(action.get("col"))
+            except (TypeError, ValueError):
+                raise ValueError("Некорректные row/col")
+            if not field_contains(row, col):
+                raise ValueError("Клетка вне поля")
+
+            plant_id = action.get("plant_id")
+            if plant_id is not None:
+                try:
+                    plant_id = int(plant_id)
+                except (TypeError, ValueError):
+                    raise ValueError("Некорректный plant_id")
+
+            parsed.append({
+                "row": row,
+                "col": col,
+                "plant_id": plant_id,
+                "auto_buy": bool(action.get("auto_buy", False)),
+            })
+        return parsed
+
+    @transaction.atomic
+    def post(self, request):
+        actions = request.data.get("actions")
+        if not isinstance(actions, list) or not actions:
+            return Response({"detail": "Ожидается непустой список actions"}, status=400)
+        if len(actions) > MAX_BATCH_ACTIONS:
+            return Response(
+                {"detail": f"Не больше {MAX_BATCH_ACTIONS} действий за запрос"},
+                status=400
+            )
+        try:
+            actions = self.parse_actions(actions)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        # Отложенный опыт применяем до загрузки: дальше опыт начисляется напрямую
+        flush_exp(request.user)
+
+        # Всё загружаем один раз; профиль и клетки — под блокировкой до конца транзакции
+        profile = PlayerProfile.objects.select_for_update().get(user=request.user)
+        # Навыки нужны только для опыта за сбор; посадке хватает модификаторов
+        user_skills = []
+        if any(action["plant_id"] is None for action in actions):
+            user_skills = load_user_skills(request.user, profile)
+        farming_skill = find_farming_skill(user_skills)
+        growth = skill_effect(skill_modifiers(request.user, profile), FARMING_SKILL_CODE)
+
+        coords = {(a["row"], a["col"]) for a in actions}
+        field = Cell.objects.select_for_update().filter(
+            owner=request.user,
+            row__in={row for row, _ in coords},
+            col__in={col for _, col in coords},
+        )
+        cells = {(cell.row, cell.col): cell for cell in field}
+        if coords - cells.keys():
+            # За пределами стартового поля клетки создаются при первом действии
+            create_cells(request.user, coords - cells.keys())
+            cells = {(cell.row, cell.col): cell for cell in field.all()}
+        attach_items(list(cells.values()))
+
+        catalog = get_catalog()
+        seeds = {}
+        for action in actions:
+            seed = catalog.seed(action["plant_id"])
+            if seed is not None:
+                seeds[seed.id] = seed
+
+        item_ids = set(seeds)
+        item_ids.update(
+            cell.shop_item.harvest_item_id
+            for cell in cells.values()
+            if cell.shop_item and cell.shop_item.harvest_item_id
+        )
+        # Инвентарь в памяти: {item_id: quantity}, в БД пишем только разницу
+        inventory = dict(
+            InventoryItem.objects
+            .filter(player=profile, item_id__in=item_ids)
+            .values_list("item_id", "quantity")
+        )
+        initial_inventory = dict(inventory)
+
+        results = []
+        changed_cells = {}
+        coins_spent = 0
+        harvested = 0
+        exp_changed = False
+        skill_changed = False
+        modifiers_changed = False
+
+        for index, action in enumerate(actions):
+            result = {"index": index, "row": action["row"], "col": action["col"]}
+            results.append(result)
+            cell = cells[(action["row"], action["col"])]
+
+            # 🌾 СБОР УРОЖАЯ
+            if action["plant_id"] is None:
+                if not cell.is_ready_for_harvest:
+                    result.update(ok=False, detail="Растение не созрело")
+                    continue
+                harvest_item = cell.shop_item.harvest_item
+                if not harvest_item:
+                    result.update(ok=False, detail="Нет связанного урожая")
+                    continue
+
+                yield_qty = cell.shop_item.harvest_yield or 1
+                inventory[harvest_item.id] = inventory.get(harvest_item.id, 0) + yield_qty
+
+                if farming_skill:
+                    if farming_skill.add_exp(HARVEST_EXP_GAIN, save=False):
+                        # Новый уровень навыка действует на следующие посадки пакета
+                        refresh_modifiers(profile, user_skills)
+                        growth = skill_effect(profile.skill_modifiers, FARMING_SKILL_CODE)
+                        modifiers_changed = True
+                    skill_changed = True
+                add_profile_exp(profile, HARVEST_EXP_GAIN)
+                exp_changed = True
+                harvested += 1
+
+                cell.clear()
+                changed_cells[cell.pk] = cell
+
+                result.update(
+                    ok=True,
+                    action="harvest",
+                    cell=CellSerializer(cell).data,
+                    harvest_added={
+                        "item": harvest_item.name,
+                        "quantity": yield_qty,
+                        "exp_gained": HARVEST_EXP_GAIN
+                    },
+                )
+                continue
+
+            # 🌱 ПОСАДКА СЕМЯН
+            shop_item = seeds.get(action["plant_id"])
+            if shop_item is None:
+                result.update(ok=False, detail="Семя не найдено")
+                continue
+
+            if inventory.get(shop_item.id, 0) > 0:
+                inventory[shop_item.id] -= 1
+            else:
+                # Автопокупка: купленное семя сразу сажаем
+                if not action["auto_buy"] or profile.coins_balance < shop_item.price_coins:
+                    result.update(ok=False, detail="Недостаточно семян или монет")
+                    continue
+                profile.coins_balance -= shop_item.price_coins
+                coins_spent += shop_item.price_coins
+
+            final_duration = grow_duration_seconds(shop_item, growth["value"])
+
+            cell.plant(shop_item, final_duration)
+            changed_cells[cell.pk] = cell
+
+            result.update(
+                ok=True,
+                action="plant",
+                cell=CellSerializer(cell).data,
+                seeds_remaining=inventory.get(shop_item.id, 0),
+                growth_bonus=growth_bonus_data(growth, shop_item, final_duration),
+            )
+
+        # Запись результатов пачкой: монеты и инвентарь — условными UPDATE по разнице
+        deltas = {
+            item_id: quantity - initial_inventory.get(item_id, 0)
+            for item_id, quantity in inventory.items()
+        }
+        if (
+            not debit_coins(profile.id, coins_spent, Reason.AUTO_BUY)
+            or not apply_inventory_deltas(profile.id, deltas)
+        ):
+            # Баланс или инвентарь успели измениться параллельным запросом
+            transaction.set_rollback(True)
+            return Response(
+                {"detail": "Баланс или инвентарь изменились, повторите"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if changed_cells:
+            Cell.objects.bulk_update(
+                changed_cells.values(),
+                ["shop_item", "planted_at", "grow_duration_seconds", "ready_at", "updated_at"]
+            )
+
+        if exp_changed:
+            profile.harvest_count += harvested
+            update_fields = ["exp", "level", "harvest_count"]
+            if modifiers_changed:
+                update_fields.append("skill_modifiers")
+            profile.save(update_fields=update_fields)
+        if skill_changed:
+            save_user_skills([farming_skill])
+
+        return Response({
+            "results": results,
+            "profile": profile_data(profile),
+        })
     
-class PlantListView(generics.ListAPIView):
-    queryset = ShopItem.objects.filter(is_seed=True).select_related('harvest_item')
-    serializer_class = ShopItemSerializer
+class CellHarvestAllView(APIView):
+    """
+    Сбор урожая со всех созревших клеток.
+    Число запросов не зависит от количества клеток.
+    """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [CellBatchThrottle]
+
+    @transaction.atomic
+    def post(self, request):
+        now = timezone.now()
+        # Отложенный опыт применяем до загрузки: дальше опыт начисляется напрямую
+        flush_exp(request.user)
+        profile = PlayerProfile.objects.select_for_update().get(user=request.user)
+
+        catalog = get_catalog()
+        ready_cells = Cell.objects.filter(
+            owner=request.user,
+            ready_at__lte=now,
+            shop_item_id__in=list(catalog.harvest_for_seed),
+        )
+
+        # Число созревших клеток по семенам — один запрос,
+        # урожай группируем по shop_item.harvest_item через каталог
+        harvest = {}
+        for seed_id, cells in ready_cells.values_list("shop_item").annotate(cells=Count("id")).order_by():
+            seed = catalog.items[seed_id]
+            row = harvest.setdefault(seed.harvest_item_id, {
+                "item_id": seed.harvest_item_id,
+                "item": catalog.harvest_for_seed[seed_id].name,
+                "quantity": 0,
+                "cells": 0,
+            })
+            row["quantity"] += cells * (seed.harvest_yield or 1)
+            row["cells"] += cells
+        harvested_cells = sum(row["cells"] for row in harvest.values())
+
+        if not harvested_cells:
+            return Response({
+                "harvested_cells": 0,
+                "harvest_added": [],
+                "exp_gained": 0,
+                "profile": profile_data(profile),
+            })
+
+        # Сброс клеток одним UPDATE
+        cleared = ready_cells.update(
+            shop_item=None, planted_at=None, grow_duration_seconds=None, ready_at=None,
+            updated_at=now,
+        )
+        if cleared != harvested_cells:
+            # Клетки успели измениться параллельным запросом
+            transaction.set_rollback(True)
+            return Response(
+                {"detail": "Поле изменилось, повторите сбор"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        # Инвентарь: один UPDATE для всех видов урожая + один INSERT для новых
+        apply_inventory_deltas(
+            profile.id, {item_id: row["quantity"] for item_id, row in harvest.items()}
+        )
+
+        # EXP одним шагом
+        exp_gain = harvested_cells * HARVEST_EXP_GAIN
+        user_skills = load_user_skills(request.user, profile)
+        farming_skill = find_farming_skill(user_skills)
+        update_fields = ["exp", "level", "harvest_count"]
+        if farming_skill:
+            if farming_skill.add_exp(exp_gain, save=False):
+                refresh_modifiers(profile, user_skills)
+                update_fields.append("skill_modifiers")
+            save_user_skills([farming_skill])
+        add_profile_exp(profile, exp_gain)
+        profile.harvest_count += harvested_cells
+        profile.save(update_fields=update_fields)
+
+        return Response({
+            "harvested_cells": harvested_cells,
+            "harvest_added": sorted(harvest.values(), key=lambda row: row["item_id"]),
+            "exp_gained": exp_gain,
+            "profile": profile_data(profile),
+        })
+
+class PlantListView(CatalogListView):
+    def get_items(self, catalog):
+        return sorted(catalog.seeds, key=lambda item: item.id)
 
 # =========================
 # Инвентарь игрока
@@ -250,8 +740,9 @@ class InventoryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile = PlayerProfile.objects.get(user=request.user)
-        items = InventoryItem.objects.filter(player=profile, quantity__gt=0).select_related("item")
+        items = InventoryItem.objects.filter(
+            player_id=get_profile_id(request.user), quantity__gt=0
+        ).select_related("item__category", "item__harvest_item")
         return Response(InventoryItemSerializer(items, many=True).data)
 
 # =========================
@@ -260,9 +751,8 @@ class InventoryView(APIView):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def market_inventory(request):
-    profile = PlayerProfile.objects.get(user=request.user)
     harvest_items = InventoryItem.objects.filter(
-        player=profile,
+        player_id=get_profile_id(request.user),
         item__is_harvest=True,
         quantity__gt=0
     ).select_related("item")
@@ -271,71 +761,329 @@ def market_inventory(request):
 
 class SellItemView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [SellThrottle]
 
+    @transaction.atomic
     def post(self, request):
-        profile = PlayerProfile.objects.get(user=request.user)
-        item_id = request.data.get("item_id")  # InventoryItem ID!
-        qty = int(request.data.get("quantity", 1))
-
+        profile_id = get_profile_id(request.user)
         try:
-            # ✅ InventoryItem ID
-            inventory_item = InventoryItem.objects.get(
-                id=item_id,
-                player=profile,
-                quantity__gte=qty
-            )
-        except InventoryItem.DoesNotExist:
+            item_id = int(request.data.get("item_id"))  # InventoryItem ID!
+        except (TypeError, ValueError):
+            return Response({"detail": "Некорректный item_id"}, status=400)
+        try:
+            qty = parse_quantity(request.data.get("quantity"))
+        except (TypeError, ValueError):
+            return Response({"detail": "Некорректное количество"}, status=400)
+
+        # ✅ InventoryItem ID
+        inventory = InventoryItem.objects.filter(id=item_id, player_id=profile_id)
+        shop_item_id, quantity = inventory.values_list("item_id", "quantity").first() or (None, 0)
+
+        # Списываем условным UPDATE ... WHERE quantity >= qty
+        if quantity < qty or not inventory.filter(quantity__gte=qty).update(
+            quantity=F("quantity") - qty, updated_at=timezone.now()
+        ):
             return Response({"detail": "Товар не найден в инвентаре"}, status=400)
 
-        price_per_item = inventory_item.item.price_coins
+        item = get_catalog().get(shop_item_id) or ShopItem.objects.get(id=shop_item_id)
+        price_per_item = item.price_coins
         total = price_per_item * qty
-        
-        profile.coins_balance += total
-        profile.save()
+        credit_coins(profile_id, total, Reason.SELL)
+
+        return Response({
+            "coins_balance": coins_balance(profile_id),
+            "sold": qty,
+            "total_earned": total,
+            "message": f"Продано {qty}×{item.name} за {total} монет"
+        })
+
+
+class SellBulkView(APIView):
+    """
+    Продажа нескольких строк инвентаря за один запрос:
+    {"items": [{"item_id": <InventoryItem ID>, "quantity": n}, ...]}
+    или {"sell_all_harvest": true} — весь урожай целиком.
+    Проверка — одним SELECT, списание — одним UPDATE ... CASE,
+    начисление монет — одним UPDATE.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [SellThrottle]
 
-        inventory_item.quantity -= qty
-        if inventory_item.quantity <= 0:
-            inventory_item.delete()
+    @staticmethod
+    def parse_lines(lines):
+        parsed = []
+        for line in lines:
+            if not isinstance(line, dict):
+                raise ValueError("Каждая позиция должна быть объектом")
+            try:
+                item_id = int(line.get("item_id"))
+                qty = parse_quantity(line.get("quantity"))
+            except (TypeError, ValueError):
+                raise ValueError("Некорректные item_id/quantity")
+            parsed.append((item_id, qty))
+        return parsed
+
+    @transaction.atomic
+    def post(self, request):
+        profile_id = get_profile_id(request.user)
+        catalog = get_catalog()
+        rows = InventoryItem.objects.filter(player_id=profile_id)
+
+        if request.data.get("sell_all_harvest"):
+            rows = rows.filter(item_id__in=[item.id for item in catalog.harvests], quantity__gt=0)
+            inventory = {
+                inventory_id: (item_id, quantity)
+                for inventory_id, item_id, quantity in rows.values_list("id", "item_id", "quantity")
+            }
+            lines = [(inventory_id, quantity) for inventory_id, (_, quantity) in inventory.items()]
         else:
-            inventory_item.save()
+            lines = request.data.get("items")
+            if not isinstance(lines, list) or not lines:
+                return Response({"detail": "Ожидается непустой список items"}, status=400)
+            if len(lines) > MAX_BATCH_ACTIONS:
+                return Response(
+                    {"detail": f"Не больше {MAX_BATCH_ACTIONS} позиций за запрос"},
+                    status=400
+                )
+            try:
+                lines = self.parse_lines(lines)
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=400)
+            inventory = {
+                inventory_id: (item_id, quantity)
+                for inventory_id, item_id, quantity in (
+                    rows.filter(id__in={inventory_id for inventory_id, _ in lines})
+                    .values_list("id", "item_id", "quantity")
+                )
+            }
 
+        # Проверяем все позиции по одному снимку инвентаря
+        results = []
+        selling = {}
+        total = 0
+        for index, (inventory_id, qty) in enumerate(lines):
+            result = {"index": index, "item_id": inventory_id}
+            results.append(result)
+
+            item_id, available = inventory.get(inventory_id, (None, 0))
+            item = catalog.get(item_id)
+            if item is None:
+                result.update(ok=False, detail="Товар не найден в инвентаре")
+                continue
+            if available - selling.get(inventory_id, 0) < qty:
+                result.update(ok=False, detail="Недостаточно товара")
+                continue
+
+            selling[inventory_id] = selling.get(inventory_id, 0) + qty
+            earned = item.price_coins * qty
+            total += earned
+            result.update(ok=True, name=item.name, sold=qty, total_earned=earned)
+
+        if not take_inventory_rows(profile_id, selling):
+            # Инвентарь изменился параллельным запросом после проверки
+            transaction.set_rollback(True)
+            return Response({"detail": "Инвентарь изменился, повторите запрос"}, status=409)
+        credit_coins(profile_id, total, Reason.SELL)
+
+        sold = sum(selling.values())
         return Response({
-            "coins_balance": profile.coins_balance,
-            "sold": qty,
+            "coins_balance": coins_balance(profile_id),
+            "sold": sold,
             "total_earned": total,
-            "message": f"Продано {qty}×{inventory_item.item.name} за {total} монет"
+            "results": results,
+            "message": f"Продано {sold} шт. за {total} монет"
         })
-    
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([BuyThrottle])
+@transaction.atomic
 def buy_item(request):
     item_id = request.data.get("item_id")
-    qty = int(request.data.get("quantity", 1))
-    
     try:
-        item = ShopItem.objects.get(id=item_id)
-    except ShopItem.DoesNotExist:
+        qty = parse_quantity(request.data.get("quantity"))
+    except (TypeError, ValueError):
+        return Response({"detail": "Некорректное количество"}, status=400)
+    
+    item = get_catalog().get(item_id)
+    if item is None:
         return Response({"detail": f"Товар ID={item_id} не найден"}, status=404)
     
-    profile = PlayerProfile.objects.get(user=request.user)
+    profile_id = get_profile_id(request.user)
     total_price = item.price_coins * qty
     
-    if profile.coins_balance < total_price:
+    # ✅ Покупка: UPDATE ... WHERE coins_balance >= total_price
+    if not debit_coins(profile_id, total_price, Reason.BUY):
         return Response({
-            "detail": f"Недостаточно монет! Нужно: {total_price}, есть: {profile.coins_balance}"
+            "detail": f"Недостаточно монет! Нужно: {total_price}, есть: {coins_balance(profile_id)}"
         }, status=400)
     
-    # ✅ Покупка
-    profile.coins_balance -= total_price
-    profile.save()
-    
-    inv_item, _ = InventoryItem.objects.get_or_create(
-        player=profile, item=item
-    )
-    inv_item.quantity += qty
-    inv_item.save()
+    add_inventory(profile_id, item.id, qty)
     
     return Response({
-        "coins_balance": profile.coins_balance,
+        "coins_balance": coins_balance(profile_id),
         "message": f"✅ Куплено {qty}×{item.name} за {total_price} монет"
-    })
\ No newline at end of file
+    })
+
+
+class CheckoutView(APIView):
+    """
+    Покупка корзины: {"items": [{"item_id": <ShopItem ID>, "quantity": n}, ...]}.
+    Цены берутся из каталога, сумма списывается одним условным UPDATE,
+    инвентарь пополняется одним upsert. Всё или ничего.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [BuyThrottle]
+
+    @transaction.atomic
+    def post(self, request):
+        lines = request.data.get("items")
+        if not isinstance(lines, list) or not lines:
+            return Response({"detail": "Ожидается непустой список items"}, status=400)
+        if len(lines) > MAX_BATCH_ACTIONS:
+            return Response(
+                {"detail": f"Не больше {MAX_BATCH_ACTIONS} позиций за запрос"},
+                status=400
+            )
+
+        catalog = get_catalog()
+        basket = {}
+        for line in lines:
+            if not isinstance(line, dict):
+                return Response({"detail": "Каждая позиция должна быть объектом"}, status=400)
+            try:
+                qty = parse_quantity(line.get("quantity"))
+            except (TypeError, ValueError):
+                return Response({"detail": "Некорректное количество"}, status=400)
+            item = catalog.get(line.get("item_id"))
+            if item is None:
+                return Response({"detail": f"Товар ID={line.get('item_id')} не найден"}, status=404)
+            basket[item.id] = basket.get(item.id, 0) + qty
+
+        total_price = sum(catalog.items[item_id].price_coins * qty for item_id, qty in basket.items())
+        profile_id = get_profile_id(request.user)
+
+        # ✅ UPDATE ... WHERE coins_balance >= total_price: при нехватке ничего не пишем
+        if not debit_coins(profile_id, total_price, Reason.CHECKOUT):
+            return Response({
+                "detail": f"Недостаточно монет! Нужно: {total_price}, есть: {coins_balance(profile_id)}"
+            }, status=400)
+
+        upsert_inventory(profile_id, basket)
+
+        return Response({
+            "coins_balance": coins_balance(profile_id),
+            "total_price": total_price,
+            "items": [
+                {"item_id": item_id, "name": catalog.items[item_id].name, "quantity": qty}
+                for item_id, qty in basket.items()
+            ],
+            "message": f"✅ Куплено {sum(basket.values())} шт. за {total_price} монет"
+        })
+
+# =========================
+# Журнал монет
+# =========================
+class CoinHistoryView(APIView):
+    """
+    История движения монет, новые сверху.
+    ?before=<created_at>&before_id=<id> последней записи — следующая страница
+    (id различает записи с одинаковым created_at на границе страниц).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        entries = CoinLedgerEntry.objects.filter(player_id=get_profile_id(request.user))
+
+        before = request.query_params.get("before")
+        if before:
+            before_dt = parse_datetime(before)
+            if before_dt is None:
+                return Response({"detail": "Некорректный before"}, status=400)
+            if timezone.is_naive(before_dt):
+                before_dt = timezone.make_aware(before_dt)
+            before_id = request.query_params.get("before_id")
+            if before_id is None:
+                entries = entries.filter(created_at__lt=before_dt)
+            else:
+                try:
+                    before_id = int(before_id)
+                except ValueError:
+                    return Response({"detail": "Некорректный before_id"}, status=400)
+                entries = entries.filter(
+                    Q(created_at__lt=before_dt) | Q(created_at=before_dt, id__lt=before_id)
+                )
+
+        page = list(entries.order_by("-created_at", "-id")[:COIN_HISTORY_PAGE_SIZE])
+        next_before = next_before_id = None
+        if len(page) == COIN_HISTORY_PAGE_SIZE:
+            next_before = page[-1].created_at.isoformat().replace("+00:00", "Z")
+            next_before_id = page[-1].id
+
+        return Response({
+            "entries": CoinLedgerEntrySerializer(page, many=True).data,
+            "next_before": next_before,
+            "next_before_id": next_before_id,
+        })
+
+
+# =========================
+# Рейтинги
+# =========================
+
+class LeaderboardMixin:
+    """
+    Разбор /api/leaderboard/<board>/?period=all|week
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_period(self, board: str):
+        if board not in LeaderboardEntry.Board.values:
+            return None, Response({"detail": "Рейтинг не найден"}, status=404)
+        period = resolve_period(self.request.query_params.get("period", PERIOD_ALL))
+        if period is None:
+            return None, Response({"detail": "period: all или week"}, status=400)
+        return period, None
+
+
+class LeaderboardTopView(LeaderboardMixin, APIView):
+    """
+    Первые ?limit= мест рейтинга
+    """
+    def get(self, request, board):
+        period, error = self.get_period(board)
+        if error:
+            return error
+        try:
+            limit = min(parse_quantity(request.query_params.get("limit"), LEADERBOARD_TOP_LIMIT), LEADERBOARD_MAX_LIMIT)
+        except ValueError:
+            return Response({"detail": "Некорректный limit"}, status=400)
+
+        return Response({
+            "board": board,
+            "period": period,
+            "entries": top_entries(board, period, limit),
+        })
+
+
+class LeaderboardMeView(LeaderboardMixin, APIView):
+    """
+    Место игрока и ?around= соседей сверху и снизу
+    """
+    def get(self, request, board):
+        period, error = self.get_period(board)
+        if error:
+            return error
+        try:
+            around = min(parse_quantity(request.query_params.get("around"), LEADERBOARD_AROUND), LEADERBOARD_MAX_LIMIT)
+        except ValueError:
+            return Response({"detail": "Некорректный around"}, status=400)
+
+        rank, entries = entries_around(board, period, get_profile_id(request.user), around)
+        return Response({
+            "board": board,
+            "period": period,
+            "rank": rank,
+            "entries": entries,
+        })